@@ -1,176 +1,273 @@
+# First, so the first-render figure includes the imports below
+import ctr_metrics
 import streamlit as st
 from streamlit_option_menu import option_menu
 # import gspread
 # from google.oauth2 import service_account
 # from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
-import pymongo
-from pymongo import MongoClient
 import os
-# Plotly chart to show data points with values
-import plotly.express as px
-import plotly.graph_objects as go
-
-mongo_uri = os.getenv("mongo")
-client = MongoClient(mongo_uri)
-db = client['CoachingInsights']
-collection = db['CTR_DB']
-
-# Initialize connection.
+import datetime
+import hmac
+import importlib.util
+import sys
+import uuid
+
+from pymongo.errors import PyMongoError
+
+import ctr_cache
+import ctr_db
+import ctr_rollup
+import ctr_sections
+import ctr_table
+import ctr_times
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # ctr_cache hands cached frames out as shallow views; copy-on-write (the
+    # default from pandas 3) keeps column selection from copying them and
+    # writes by one session from leaking into another.
+    pd.set_option("mode.copy_on_write", True)
+
+def lazy_import(name):
+    # Loaded on first attribute access, so a cold worker draws the menu and
+    # the date picker before paying for modules only some pages use.
+    if name not in sys.modules:
+        spec = importlib.util.find_spec(name)
+        spec.loader = importlib.util.LazyLoader(spec.loader)
+        module = sys.modules[name] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+ctr_charts = lazy_import("ctr_charts")
+ctr_overspeed = lazy_import("ctr_overspeed")
+ctr_prefetch = lazy_import("ctr_prefetch")
+ctr_range = lazy_import("ctr_range")
+ctr_speed = lazy_import("ctr_speed")
+
+# Structured timing lines on stderr: CTR_METRICS_LOG=1
+if os.getenv("CTR_METRICS_LOG") == "1" and not ctr_metrics.logger.handlers:
+    ctr_metrics.log_to_stderr()
+
+# Initialize connection: one pooled client per process (see ctr_db.connect()
+# for pool size and timeouts), checked before it is shared.
 @st.cache_resource
 def init_connection():
-    return pymongo.MongoClient(st.secrets["mongo"]["uri"])
-
-# Pull data from the collection.
+    client = ctr_db.connect(st.secrets["mongo"]["uri"], event_listeners=[ctr_metrics.CommandListener()])
+    try:
+        ctr_db.ping(client)
+    except PyMongoError as error:
+        client.close()
+        st.error(f"Cannot reach the database: {error}")
+        st.stop()
+    return client
+
+# Available Sch dates with per-date counts, from the small catalog collection.
 @st.cache_data(ttl=600)
-def get_all_data():
+def get_date_catalog():
     client = init_connection()
-    db = client["CoachingInsights"]
-    collection = db["CTR_DB"]
-    items = collection.find()
-    items = list(items)  # make hashable for st.cache_data
-    return items
+    return ctr_db.load_date_catalog(ctr_db.ctr_database(client))
 
-@st.cache_data(ttl=600)
-def get_data(train_no, sch_date):
+# Station-to-station distances; a static table, so it is kept for an hour.
+@st.cache_data(ttl=3600)
+def get_distances():
     client = init_connection()
-    db = client["CoachingInsights"]
-    collection = db["CTR_DB"]
-    if sch_date is None:
-        query = {"Train No": str(train_no)}
-    elif train_no is None:
-        query = {"Sch date": sch_date}
-    else:
-        query = {"Train No": str(train_no), "Sch date": sch_date}
-    items = collection.find(query)
-    items = list(items)  # make hashable for st.cache_data
-    return items
+    return ctr_speed.load_distances(ctr_db.ctr_database(client)[ctr_db.DISTANCES_COLLECTION])
 
-@st.cache_data(ttl=600)
-def check_stn_for_train(train_no, sch_date, stn):
+# Permitted section speeds; as static as the distances.
+@st.cache_data(ttl=3600)
+def get_speed_limits():
     client = init_connection()
-    db = client["CoachingInsights"]
-    collection = db["CTR_DB"]
-    query = {"Train No": str(train_no), "Sch date": sch_date, "Stn": stn}
-    items = list(collection.find(query))
-    return(bool(items))
-# Authorize the client
-# client = gspread.authorize(credentials)
+    return ctr_overspeed.load_speed_limits(ctr_db.ctr_database(client)[ctr_db.SPEED_LIMITS_COLLECTION])
 
-def filter_and_plot_data(Stn_A, Stn_B, total_items_on_date):
-    stnb_sl_no = 0
-    stnb_train_no = ""
-    stna_sl_no = 0
-    stna_train_no = ""
-    filtered_df = []
-    filtered_df_temp = []
-    hold_train_no = ""
-
-    for idx, item in enumerate(total_items_on_date):
-        if item["Train No"] != hold_train_no:
-            stna_train_no = ""
-            stnb_train_no = ""
-            stna_sl_no = 0
-            stnb_sl_no = 0
-            filtered_df_temp = []
-        if item["Stn"] == Stn_A:
-            stna_sl_no = int(item["SL/No"])
-            stna_train_no = item["Train No"]
-        if item["Stn"] == Stn_B:
-            stnb_sl_no = int(item["SL/No"])
-            stnb_train_no = item["Train No"]
-        if stna_train_no:
-            filtered_df_temp.append(item)
-        if stna_train_no and stnb_train_no and stna_train_no != stnb_train_no:
-            stna_train_no = ""
-            stnb_train_no = ""  
-            filtered_df_temp = []
-        elif stna_train_no == stnb_train_no and stna_sl_no < stnb_sl_no:         
-            filtered_df.extend(filtered_df_temp)
-            filtered_df_temp = []
-            stna_train_no = ""
-            stnb_train_no = ""
-            stna_sl_no = 0
-            stnb_sl_no = 0
-        hold_train_no = item["Train No"]
-
-    # Convert filtered_df to pandas DataFrame
-    final_df = pd.DataFrame(filtered_df, columns=["Train No", "Stn", "Max Speed"])
-
-    if not final_df.empty:
-        # Pivot the DataFrame to have Stn as columns and Train No as rows
-        max_length_train_no = final_df.groupby("Train No").size().idxmax()
-        max_length_stn_sequence = final_df[final_df["Train No"] == max_length_train_no]["Stn"].unique()
-
-        pivot_df = final_df.pivot(index="Train No", columns="Stn", values="Max Speed")
-        pivot_df = pivot_df.reindex(columns=max_length_stn_sequence)
+# Columns each page reads from CTR_DB; everything else stays on the server.
+TRAIN_COLUMNS = ctr_db.TRAIN_COLUMNS
+SECTION_COLUMNS = ctr_db.SECTION_COLUMNS
 
-        st.write(f"Max Speed Analysis between {Stn_A} and {Stn_B}:")
-        st.dataframe(pivot_df)
-
-        final_df["Max Speed"] = pd.to_numeric(final_df["Max Speed"], errors='coerce')
-        grouped_df = final_df.groupby("Stn")["Max Speed"].agg(["max", "min", "mean"]).reset_index()
-        grouped_df.columns = ["Stn", "Max Speed", "Min Speed", "Avg Speed"]
-
-        candlestick_fig = go.Figure(data=[
-            go.Candlestick(x=grouped_df["Stn"],
-                            open=grouped_df["Min Speed"],
-                            high=grouped_df["Max Speed"],
-                            low=grouped_df["Min Speed"],
-                            close=grouped_df["Avg Speed"],
-                            increasing_line_color='green', decreasing_line_color='red', showlegend=False)
-        ])
-        candlestick_fig.update_layout(
-            title=f"Max Speed Chart Analysis between {Stn_A} and {Stn_B} :",
-            xaxis_title="Station",
-            yaxis_title="Speed (Kmph)",
-            xaxis=dict(categoryorder='array', categoryarray=max_length_stn_sequence),
-            dragmode=False
-        )
+# One compact copy of each query result, shared by all sessions: closed Sch
+# dates are kept until ctr_ingest rewrites them, open dates are topped up
+# with new and changed documents only.
+@st.cache_resource
+def get_frame_cache():
+    db = ctr_db.ctr_database(init_connection())
+    return ctr_cache.CTRFrameCache(db[ctr_db.CTR_COLLECTION], TRAIN_COLUMNS, watermark_field="Updated",
+                                   catalog=db[ctr_db.DATES_COLLECTION], disk=ctr_cache.default_disk_cache())
+
+# Pull data from the collection; a read-only view, not a copy.
+def get_data(train_no, sch_date, columns=TRAIN_COLUMNS):
+    return get_frame_cache().get(train_no, sch_date)[list(columns)]
 
-        for i, row in grouped_df.iterrows():
-            candlestick_fig.add_annotation(x=row["Stn"], y=row["Max Speed"],
-                                            text=f"{row['Max Speed']:.2f}", showarrow=False,
-                                            yshift=10, font=dict(color="white", size=12))
-            candlestick_fig.add_annotation(x=row["Stn"], y=row["Min Speed"],
-                                            text=f"{row['Min Speed']:.2f}", showarrow=False,
-                                            yshift=-10, font=dict(color="white", size=12))
-            candlestick_fig.add_annotation(x=row["Stn"], y=row["Avg Speed"],
-                                            text=f"{row['Avg Speed']:.2f}", showarrow=False,
-                                            yshift=0, font=dict(color="white", size=12))
-
-        st.plotly_chart(candlestick_fig)
+# Station/train position index of one Sch date, rebuilt only when the day's
+# records change.
+def get_section_index(sch_date):
+    return get_frame_cache().derived(None, sch_date, ctr_sections.SectionIndex)
+
+def check_stn_for_train(train_no, sch_date, stn):
+    return get_section_index(sch_date).has_station(train_no, stn)
+# Authorize the client
+# client = gspread.authorize(credentials)
+
+def show_chart(fig):
+    # Streamlit serialises the figure to JSON here
+    with ctr_metrics.span("plotly_chart"):
+        st.plotly_chart(fig)
+
+# Only the visible page of a table goes to the browser; sorting and filtering
+# run here, on the TableView's frame.
+def paged_dataframe(view, key, page_sizes=(25, 50, 100, 250), **kwargs):
+    filter_col, sort_col, order_col, size_col, page_col = st.columns([3, 2, 1, 1, 1])
+    text = filter_col.text_input("Filter:", key=f"{key}_filter").strip()
+    sort_by = sort_col.selectbox("Sort by:", [None] + view.columns, format_func=lambda c: "-" if c is None else str(c),
+                                 key=f"{key}_sort")
+    descending = order_col.toggle("Descending", key=f"{key}_desc")
+    page_size = size_col.selectbox("Rows:", page_sizes, index=1, key=f"{key}_size")
+    total = len(view.order(sort_by, not descending, text))
+    pages = ctr_table.page_bounds(1, page_size, total)[2]
+    # A narrower filter or bigger pages can leave the kept page past the end
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = page_col.number_input("Page:", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    start, stop, pages = ctr_table.page_bounds(page, page_size, total)
+    rows, _ = view.rows(start, stop, sort_by, not descending, text)
+    st.dataframe(rows, **kwargs)
+    if total:
+        st.caption(f"Rows {start + 1}-{stop} of {total}, page {start // page_size + 1} of {pages}")
     else:
-        st.write("No data found for the given Sch Date.")
+        st.caption("No matching rows.")
 
-# Define different functionalities
-def max_speed_trains():
-    st.markdown("""
+def page_title(title):
+    st.markdown(f"""
         <div style="display: flex; align-items: center; justify-content: center; flex-direction: column; padding: 0px; border-radius: 1px;">
-            <h2 id="dashboard-title" style="margin: 0; font-size: 1.5em;">🚄 Maximum Speed Analysis of EMU Locals (Trains)</h2>
+            <h2 id="dashboard-title" style="margin: 0; font-size: 1.5em;">{title}</h2>
         </div>
         <script>
             const dashboardTitle = document.getElementById('dashboard-title');
-            const observer = new MutationObserver(() => {
+            const observer = new MutationObserver(() => {{
                 const body = document.body;
                 const isDarkMode = window.getComputedStyle(body).backgroundColor === 'rgb(0, 0, 0)';
                 dashboardTitle.style.color = isDarkMode ? '#fff' : '#333';
-            });
-            observer.observe(document.body, { attributes: true, attributeFilter: ['class'] });
+            }});
+            observer.observe(document.body, {{ attributes: true, attributeFilter: ['class'] }});
         </script>
         """, unsafe_allow_html=True)
+
+def select_sch_date():
+    catalog = get_date_catalog()
+    distinct_sch_date = [row["Sch date"] for row in catalog]
+
+    # Date input for Sch Date with default value set to the latest date in distinct_sch_date
+    sch_date = st.date_input("Enter Sch Date:", value=max(distinct_sch_date), min_value=min(distinct_sch_date), max_value=max(distinct_sch_date))
+
+    counts = {row["Sch date"]: row for row in catalog}.get(sch_date.strftime("%Y-%m-%d"))
+    if counts:
+        st.caption(f"{counts['Trains']} trains, {counts['Stations']} stations, {counts['Records']} records")
+    return sch_date
+
+def select_sch_date_range():
+    distinct_sch_date = [datetime.date.fromisoformat(row["Sch date"]) for row in get_date_catalog()]
+    latest = max(distinct_sch_date)
+    picked = st.date_input("Enter Sch Date range:", value=(latest, latest), min_value=min(distinct_sch_date), max_value=latest)
+    # While the user is still picking the end date only the start is set
+    start, end = picked if len(picked) == 2 else (picked[0], picked[0])
+    return [d.strftime("%Y-%m-%d") for d in distinct_sch_date if start <= d <= end]
+
+# Per-(Stn, Train No) and per-Stn Max Speed of Sch dates, read from the
+# rollup collections, which are rebuilt only when the day's records change.
+@st.cache_resource
+def get_rollup_cache():
+    client = init_connection()
+    return ctr_rollup.RollupCache(ctr_db.ctr_database(client))
+
+def get_speed_rollups(sch_date):
+    return get_rollup_cache().get(sch_date)
+
+# Pivot and chart of one (Sch date, Stn_A, Stn_B), from the section index
+# over the day's per-train rollup rather than the raw records
+def get_section_view(sch_date, Stn_A, Stn_B):
+    return get_rollup_cache().derived(sch_date, ctr_charts.section_speed_view, Stn_A, Stn_B,
+                                      base=ctr_rollup.section_index)
+
+# The pivot as a pageable table, with Train No as a column
+def get_section_table(sch_date, Stn_A, Stn_B):
+    return get_rollup_cache().derived(sch_date, ctr_table.pivot_view,
+                                      base=(ctr_charts.section_speed_view, (Stn_A, Stn_B), ctr_rollup.section_index))
+
+# The train's line comes from its own records; the rollup only adds the
+# day's best at each station
+def get_train_speed_figure(sch_date, train_no):
+    station_max = get_rollup_cache().derived(sch_date, ctr_rollup.station_max)
+    return ctr_charts.train_speed_figure(get_data(train_no, sch_date), station_max)
+
+def filter_and_plot_data(Stn_A, Stn_B, sch_date):
+    view = get_section_view(sch_date, Stn_A, Stn_B)
+
+    if view is not None:
+        candlestick_fig = view[1]
+
+        st.write(f"Max Speed Analysis between {Stn_A} and {Stn_B}:")
+        paged_dataframe(get_section_table(sch_date, Stn_A, Stn_B), "section_pivot", hide_index=True)
+
+        show_chart(candlestick_fig)
+    else:
+        st.write("No data found for the given Sch Date.")
+
+# Streams the dates one at a time through fixed-size sketches, so memory does
+# not grow with the length of the range.
+@st.cache_data(ttl=600, max_entries=32)
+def get_section_range_stats(sch_dates, Stn_A, Stn_B):
+    frames = ctr_range.iter_date_frames(get_frame_cache().fetch_uncached, sch_dates)
+    return ctr_range.section_range_stats(frames, Stn_A, Stn_B)
+
+def range_plot_data(Stn_A, Stn_B, sch_dates):
+    stations, sections, daily = get_section_range_stats(sch_dates, Stn_A, Stn_B)
+    if stations.empty:
+        st.write("No data found for the given Sch Dates.")
+        return
+
+    st.write(f"Max Speed (Kmph) between {Stn_A} and {Stn_B} over {len(sch_dates)} day(s):")
+    st.dataframe(stations.round(2))
+
+    show_chart(ctr_charts.speed_trend_figure(daily, Stn_A, Stn_B))
+
+    if not sections.empty:
+        st.write("Actual running time per section (minutes):")
+        st.dataframe(sections.round(2))
+
+# Background warm-up of what the Trains page is likely to show next, capped
+# by the memory held in the frame cache.
+@st.cache_resource
+def get_prefetcher():
+    return ctr_prefetch.Prefetcher(max_workers=int(os.getenv("CTR_PREFETCH_WORKERS", "2")),
+                                   max_bytes=int(os.getenv("CTR_PREFETCH_MAX_MB", "512")) * 1024 * 1024,
+                                   usage=get_frame_cache().nbytes)
+
+def prefetch_neighbours(sch_date_str):
+    # Users step through consecutive dates, or through the trains of a date;
+    # the other trains of this date are already in its cached frame
+    dates = [row["Sch date"] for row in get_date_catalog()]
+    at = dates.index(sch_date_str) if sch_date_str in dates else None
+    near_dates = [] if at is None else [dates[i] for i in (at + 1, at - 1) if 0 <= i < len(dates)]
+    # Jobs get the shared caches themselves: Streamlit's cache decorators
+    # expect the script thread
+    frame_cache, rollup_cache = get_frame_cache(), get_rollup_cache()
+    jobs = [(rollup_cache.get, (sch_date,)) for sch_date in near_dates]
+    jobs += [(frame_cache.warm, (None, sch_date)) for sch_date in near_dates]
+    owner = st.session_state.setdefault("prefetch_owner", uuid.uuid4().hex)
+    get_prefetcher().schedule(owner, sch_date_str, jobs)
+
+# Define different functionalities
+def max_speed_trains():
+    page_title("🚄 Maximum Speed Analysis of EMU Locals (Trains)")
     
     # Input field for Sch Date
-    # Fetch distinct Sch Date values from the database
-    sch_date_list = [item["Sch date"] for item in get_all_data()]
-    distinct_sch_date = sorted(set(sch_date_list))
+    sch_date = select_sch_date()
 
-    # Date input for Sch Date with default value set to the first date in distinct_sch_date
-    sch_date = st.date_input("Enter Sch Date:", value=max(distinct_sch_date), min_value=min(distinct_sch_date), max_value=max(distinct_sch_date))
+    # Distinct Train No values of the selected Sch Date, from the daily rollup
+    train_no_list = get_speed_rollups(sch_date.strftime("%Y-%m-%d"))[0]["Train No"]
+    distinct_train_no = sorted(train_no_list.unique())
 
-    # Fetch distinct Train No values for the selected Sch Date from the database
-    train_no_list = [item["Train No"] for item in get_data(None, sch_date.strftime("%Y-%m-%d"))]
-    distinct_train_no = sorted(set(train_no_list))
+    if not distinct_train_no:
+        st.write("No data found for the given Sch Date.")
+        return
 
     # Dropdown for Train No
     train_no = st.selectbox("Select Train No:", distinct_train_no)
@@ -178,19 +275,17 @@ def max_speed_trains():
     # Convert Sch Date to YYYY-MM-DD format
     sch_date_str = sch_date.strftime("%Y-%m-%d")
     
-    data = get_data(train_no=train_no, sch_date=sch_date_str)  # Convert cursor to list
+    df = get_data(train_no=train_no, sch_date=sch_date_str)
 
-    if data:
-        # Convert data to DataFrame
-        df = pd.DataFrame(data)
-        
+    if not df.empty:
+        df = df.sort_values("SL/No", kind="stable")
         df["Stn"]  = pd.Categorical(df["Stn"], categories=df["Stn"].unique(), ordered=True)
         df = df.sort_values("Stn")
-        df["Max Speed"] = pd.to_numeric(df["Max Speed"], errors='coerce')
 
         # Display data in Streamlit
         # Select only the required columns
         filtered_df = df[["Train No", "Sch date", "Stn", "S/Arr", "S/Dep", "A/Arr", "A/Dep", "Max Speed"]]
+        filtered_df = filtered_df.assign(**{column: ctr_times.format_minutes(filtered_df[column]) for column in ctr_times.TIME_COLUMNS})
 
        
         st.write(f"Showing data for: Train no={train_no}, Sch date={sch_date_str} :")
@@ -201,7 +296,7 @@ def max_speed_trains():
             """,
             unsafe_allow_html=True
         )
-        st.dataframe(filtered_df, width=1500, height=600)
+        paged_dataframe(ctr_table.TableView(filtered_df), "train_records", width=1500, hide_index=True)
         st.markdown(
             """
             </div>
@@ -210,87 +305,143 @@ def max_speed_trains():
         )
         
         # Plot line graph with Stn and Max Speed
-        if not df.empty:
-            fig = px.line(df, x="Stn", y="Max Speed", title="Max Speed by Station", markers=True)
-            
-            fig.update_traces(text=df["Max Speed"], textposition="top center", mode='lines+markers+text')
-
-            # Add neon glow effect to the line
-            fig.update_traces(line=dict(color='cyan', width=0.5))
-            fig.update_layout(
-                paper_bgcolor='black',
-                plot_bgcolor='black',
-                font_color='white',
-                title_font=dict(size=24, color='white'),
-                xaxis=dict(showgrid=False, zeroline=False),
-                yaxis=dict(showgrid=False, zeroline=False),
-                shapes=[
-                    dict(
-                        type='line',
-                        x0=df["Stn"].iloc[i],
-                        y0=df["Max Speed"].iloc[i],
-                        x1=df["Stn"].iloc[i+1],
-                        y1=df["Max Speed"].iloc[i+1],
-                        line=dict(color='cyan', width=1, dash='solid')
-                    ) for i in range(len(df)-1)
-                ]
-            )
-            fig.update_layout(
-                xaxis_title="Station", 
-                yaxis_title="Max Speed (Kmph)",
-                xaxis=dict(categoryorder='array', categoryarray=df["Stn"]),
-                dragmode=False,  # Disable zoom
-                font=dict(size=17),  # Increase font size
-                height=600,  # Increase height
-                width=1800  # Increase width
-            )
-
-            st.plotly_chart(fig)
+        show_chart(get_train_speed_figure(sch_date_str, train_no))
+
+        prefetch_neighbours(sch_date_str)
     else:
         st.write("No data found for the given Train No and Sch Date.")
 
 def max_speed_sections():
-    st.markdown("""
-    <div style="display: flex; align-items: center; justify-content: center; flex-direction: column; padding: 0px; border-radius: 1px;">
-        <h2 id="dashboard-title" style="margin: 0; font-size: 1.5em;">🚄 Maximum Speed Analysis of EMU Locals (Sections)</h2>
-    </div>
-    <script>
-        const dashboardTitle = document.getElementById('dashboard-title');
-        const observer = new MutationObserver(() => {
-            const body = document.body;
-            const isDarkMode = window.getComputedStyle(body).backgroundColor === 'rgb(0, 0, 0)';
-            dashboardTitle.style.color = isDarkMode ? '#fff' : '#333';
-        });
-        observer.observe(document.body, { attributes: true, attributeFilter: ['class'] });
-    </script>
-    """, unsafe_allow_html=True)
+    page_title("🚄 Maximum Speed Analysis of EMU Locals (Sections)")
     
-    # Input field for Sch Date
-    # Fetch distinct Sch Date values from the database
-    sch_date_list = [item["Sch date"] for item in get_all_data()]
-    distinct_sch_date = sorted(set(sch_date_list))
-
-    # Date input for Sch Date with default value set to the first date in distinct_sch_date
-    sch_date = st.date_input("Enter Sch Date:", value=max(distinct_sch_date), min_value=min(distinct_sch_date), max_value=max(distinct_sch_date))
+    range_mode = st.toggle("Analyse a date range")
+    if range_mode:
+        sch_dates = select_sch_date_range()
+        if not sch_dates:
+            st.write("No data found for the given Sch Dates.")
+            return
+    else:
+        # Input field for Sch Date
+        sch_dates = [select_sch_date().strftime("%Y-%m-%d")]
 
-    # Fetch distinct Train No values for the selected Sch Date from the database
-    total_items_on_date = get_data(None, sch_date.strftime("%Y-%m-%d"))
+    # Stations of the (last) selected Sch Date
+    stations = get_speed_rollups(sch_dates[-1])[1]["Stn"]
 
     # Call the function with appropriate parameters
     Stn_A = "SDAH"
     Stn_B = "RHA"
     # Dropdowns for Stn_A and Stn_B
-    stn_list = sorted(set(item["Stn"] for item in total_items_on_date))
+    stn_list = sorted(stations)
     Stn_A = st.selectbox("Select Station A:", stn_list)
     Stn_B = st.selectbox("Select Station B:", stn_list)
-    filter_and_plot_data(Stn_A, Stn_B, total_items_on_date)
+    if range_mode:
+        range_plot_data(Stn_A, Stn_B, sch_dates)
+    else:
+        filter_and_plot_data(Stn_A, Stn_B, sch_dates[-1])
     
 
+# Running times of every hop of every train on a date, parsed once per date.
+def get_running_times(sch_date):
+    return get_frame_cache().derived(None, sch_date, ctr_times.running_times)
+
 def sectionwise_time():
-    st.write("This is the sectionwise time page.")
+    page_title("⏱️ Sectionwise Running Time of EMU Locals")
+
+    # Input field for Sch Date
+    sch_date = select_sch_date()
+    sch_date_str = sch_date.strftime("%Y-%m-%d")
+
+    runs = get_running_times(sch_date_str)
+    if runs.empty:
+        st.write("No data found for the given Sch Date.")
+        return
+
+    summary = ctr_times.section_summary(runs).sort_values("Total Lost", ascending=False)
+    st.write(f"Scheduled vs actual running time per section on {sch_date_str} (minutes, lost > 0, gained < 0):")
+    st.dataframe(summary.round(2), hide_index=True)
+
+    show_chart(ctr_charts.lost_time_figure(summary.head(20)))
+
+    # Drill down into one train
+    train_no = st.selectbox("Select Train No:", sorted(runs["Train No"].unique()))
+    st.dataframe(runs[runs["Train No"] == train_no], hide_index=True)
+
+# Hops of all trains on the picked dates, joined with distances in one go.
+# Dates are read one at a time without going into the frame cache, so a long
+# range doesn't push out the dates other sessions are looking at.
+@st.cache_data(ttl=600, max_entries=32)
+def get_speed_summary(sch_dates):
+    frames = ctr_range.iter_date_frames(get_frame_cache().fetch_uncached, sch_dates)
+    runs = [ctr_times.running_times(records) for _, records in frames]
+    if not runs:
+        return pd.DataFrame()
+    speeds = ctr_speed.sectional_speeds(pd.concat(runs, ignore_index=True), get_distances())
+    return ctr_speed.speed_summary(speeds) if not speeds.empty else pd.DataFrame()
 
 def sectional_speed():
-    st.write("This is the sectional speed page.")
+    page_title("🚆 Sectional Speed of EMU Locals")
+
+    sch_dates = select_sch_date_range()
+    distances = get_distances()
+    if distances.empty:
+        st.write(f"No section distances found in {ctr_db.DISTANCES_COLLECTION}.")
+        return
+
+    summary = get_speed_summary(tuple(sch_dates))
+    if summary.empty:
+        st.write("No data found for the given Sch Dates.")
+        return
+
+    summary = summary.sort_values("Runs", ascending=False)
+    summary.insert(0, "Section", summary["From"] + " → " + summary["To"])
+    st.write(f"Average sectional speed (Kmph) over {len(sch_dates)} day(s):")
+    st.dataframe(summary.round(1), hide_index=True)
+
+    sections = st.multiselect("Sections to compare:", list(summary["Section"]), default=list(summary["Section"].head(10)))
+    show_chart(ctr_charts.speed_box_figure(summary[summary["Section"].isin(sections)]))
+
+# Violations of every train over the picked dates, scanned one date at a time
+# and indexed for drill-down; shared by all sessions.
+@st.cache_resource(ttl=600, max_entries=32)
+def get_violation_index(sch_dates, default_limit, tolerance):
+    limits = get_speed_limits()
+    frames = ctr_range.iter_date_frames(get_frame_cache().fetch_uncached, sch_dates)
+    with ctr_metrics.span("overspeed_scan", dates=len(sch_dates)):
+        violations = [ctr_overspeed.scan_overspeed(records, limits, default_limit, tolerance)
+                      for _, records in frames]
+    return ctr_overspeed.ViolationIndex(pd.concat(violations, ignore_index=True))
+
+def overspeed():
+    page_title("🚨 Overspeed Violations of EMU Locals")
+
+    sch_dates = select_sch_date_range()
+    if not sch_dates:
+        st.write("No data found for the given Sch Dates.")
+        return
+    default_limit = st.number_input("Limit for sections without one (Kmph, 0 = don't check):", min_value=0, value=0, step=5)
+    tolerance = st.number_input("Tolerance (Kmph):", min_value=0, value=0, step=1)
+    if get_speed_limits().empty and not default_limit:
+        st.write(f"No speed limits found in {ctr_db.SPEED_LIMITS_COLLECTION}; set a limit for sections without one.")
+        return
+
+    index = get_violation_index(tuple(sch_dates), default_limit or None, tolerance)
+    violations = index.violations
+    st.write(f"{len(violations)} violation(s) by {violations['Train No'].nunique()} train(s) "
+             f"at {violations['Stn'].nunique()} station(s) over {len(sch_dates)} day(s).")
+    if violations.empty:
+        return
+
+    by_station, by_train = st.columns(2)
+    by_station.dataframe(index.counts("Stn").round(1), hide_index=True)
+    by_train.dataframe(index.counts("Train No").round(1), hide_index=True)
+
+    # Drill down by any combination of date, train and station
+    pick_date, pick_train, pick_stn = st.columns(3)
+    sch_date = pick_date.selectbox("Sch date:", ["All"] + index.values("Sch date"))
+    train_no = pick_train.selectbox("Train No:", ["All"] + index.values("Train No"))
+    stn = pick_stn.selectbox("Station:", ["All"] + index.values("Stn"))
+    rows = index.lookup(*(None if value == "All" else value for value in (sch_date, train_no, stn)))
+    paged_dataframe(ctr_table.TableView(rows.round(1)), "overspeed_rows", hide_index=True)
 
 # Sidebar configuration
 # Remove whitespace from the top of the page and sidebar
@@ -367,6 +518,7 @@ menu_options = {
     "Max Speed (Sections)": {"icon": "clock", "function": max_speed_sections},
     "Sectionwise Time": {"icon": "clock-history", "function": sectionwise_time},
     "Sectional Speed": {"icon": "speedometer", "function": sectional_speed},
+    "Overspeed": {"icon": "exclamation-triangle", "function": overspeed},
 }
 
 if "menu_expanded" not in st.session_state:
@@ -401,5 +553,49 @@ with st.sidebar:
             key="menu_option"
         )
 
+# Optional debug panel: run with CTR_DEBUG=1, or set debug_token in the
+# secrets and open the app with ?debug=<token>. Not a bare ?debug=1: the
+# panel shows the Mongo pool and process-wide timings.
+def debug_enabled():
+    if os.getenv("CTR_DEBUG") == "1":
+        return True
+    token = st.secrets.get("debug_token")
+    given = st.query_params.get("debug")
+    return bool(token) and given is not None and hmac.compare_digest(str(given), str(token))
+
+debug = debug_enabled()
+
+def debug_panel(run):
+    history = st.session_state.setdefault("rerun_seconds", [])
+    history.append(run.seconds)
+    del history[:-50]
+    with st.sidebar.expander("Debug: timings", expanded=False):
+        st.write(f"First render: {process_first_render * 1000:.0f} ms in this process, "
+                 f"{st.session_state['first_render'] * 1000:.0f} ms in this session")
+        try:
+            st.write(f"Mongo ping: {ctr_db.ping(init_connection()) * 1000:.1f} ms, "
+                     f"pool of {ctr_db.client_options()['maxPoolSize']}")
+        except PyMongoError as error:
+            st.write(f"Mongo ping failed: {error}")
+        st.write(f"Rerun: {run.seconds * 1000:.0f} ms (session p50 {pd.Series(history).median() * 1000:.0f} ms, max {max(history) * 1000:.0f} ms over {len(history)})")
+        spans = pd.DataFrame([{"Stage": name, "ms": seconds * 1000, **fields} for name, seconds, fields in run.spans])
+        if not spans.empty:
+            st.dataframe(spans.round(2), hide_index=True)
+        if run.counters:
+            st.write("Counters:", dict(run.counters))
+        stage_totals, counters = ctr_metrics.totals()
+        st.write("Process totals:")
+        st.dataframe(pd.DataFrame([{"Stage": name, "Count": n, "Total ms": total * 1000, "Max ms": most * 1000}
+                                   for name, (n, total, most) in stage_totals.items()]).round(2), hide_index=True)
+        st.write(counters)
+
 # Call the selected function
-menu_options[menu_selected]["function"]()
+with ctr_metrics.collect(measure_bytes=debug, page=menu_selected) as run:
+    menu_options[menu_selected]["function"]()
+# Time to first render, per worker process and per session
+process_first_render = ctr_metrics.first_render()
+if "first_render" not in st.session_state:
+    st.session_state["first_render"] = run.seconds
+    ctr_metrics.record("session_first_render", run.seconds, page=menu_selected)
+if debug:
+    debug_panel(run)
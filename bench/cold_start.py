@@ -0,0 +1,112 @@
+"""Time-to-first-render of app.py in a fresh process, on synthetic data.
+
+    python -m bench.cold_start                   # mongomock, 3 fresh processes
+    python -m bench.cold_start --update-baseline
+
+Each run starts a new interpreter with an empty disk cache, loads the
+synthetic days into mongomock (with catalog and rollups, as ctr_ingest
+leaves them) and then times the app's first script run - imports,
+connection, date catalog and the default page - through Streamlit's
+AppTest. The median over --repeat runs is compared with the stored
+baseline; the slowest stages of the last run are listed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "cold_start_baseline.json")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Differences below this are noise, whatever the ratio
+MIN_SECONDS = 0.05
+
+CHILD = """
+import json, sys, time
+import mongomock, pymongo
+import ctr_db
+import ctr_metrics
+import ctr_rollup
+from bench import synthetic
+
+client = mongomock.MongoClient()
+db = client[ctr_db.DB_NAME]
+synthetic.load(db, dates={dates}, trains_per_day={trains})
+# As after ctr_ingest: catalog and rollups are already there
+ctr_rollup.refresh_rollups(db, [row["Sch date"] for row in ctr_db.load_date_catalog(db)])
+pymongo.MongoClient = lambda *args, **kwargs: client
+stages_before = ctr_metrics.totals()[0]
+
+from streamlit.testing.v1 import AppTest
+
+before = set(sys.modules)
+app = AppTest.from_file({app!r}, default_timeout=300)
+app.secrets["mongo"] = {{"uri": "mongodb://bench"}}
+# The app's own first-render figure shouldn't include the data load above
+ctr_metrics.restart_first_render_clock()
+started = time.perf_counter()
+app.run()
+seconds = time.perf_counter() - started
+if app.exception:
+    sys.exit(f"app raised: {{app.exception[0].value}}")
+stages = {{name: total[1] - stages_before.get(name, (0, 0.0))[1] for name, total in ctr_metrics.totals()[0].items()}}
+print(json.dumps({{"first_render": seconds, "modules": len(set(sys.modules) - before), "stages": stages}}))
+"""
+
+
+def cold_run(dates, trains):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, CTR_CACHE_DIR=cache_dir)
+        code = CHILD.format(dates=dates, trains=trains, app=os.path.join(ROOT, "app.py"))
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                             capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dates", type=int, default=2)
+    parser.add_argument("--trains", type=int, default=100, help="trains per day")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = {"dates": args.dates, "trains": args.trains, "backend": "mongomock"}
+    runs = [cold_run(args.dates, args.trains) for _ in range(args.repeat)]
+    result = {
+        "first_render": round(statistics.median(run["first_render"] for run in runs), 3),
+        "modules": max(run["modules"] for run in runs),
+    }
+    print(f"first render {result['first_render']:.3f}s (median of {args.repeat}), "
+          f"{result['modules']} modules imported by the app")
+    stages = runs[-1]["stages"]
+    for name in sorted(stages, key=stages.get, reverse=True)[:8]:
+        print(f"  {name:<16}{stages[name]:>10.4f}s")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, **result}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print(f"baseline was recorded for {baseline['config']}, not comparing")
+        return 0
+    limit = max(baseline["first_render"] * args.tolerance, baseline["first_render"] + MIN_SECONDS)
+    if result["first_render"] > limit:
+        print(f"REGRESSION first_render: {result['first_render']:.3f}s vs baseline {baseline['first_render']:.3f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
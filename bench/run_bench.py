@@ -0,0 +1,143 @@
+"""Time and measure each stage of the CTR data path on synthetic data.
+
+    python -m bench.run_bench                      # mongomock, default size
+    python -m bench.run_bench --mongo-uri mongodb://localhost:27017
+    python -m bench.run_bench --update-baseline    # store new reference
+
+Every stage reports its best wall time over --repeat runs and its peak
+traced memory; the run fails when a stage is more than --tolerance times
+slower or bigger than the stored baseline for the same data size.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import plotly.io
+
+import ctr_charts
+import ctr_db
+import ctr_sections
+import ctr_times
+from bench import synthetic
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+BENCH_DB_NAME = "CoachingInsightsBench"
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_PEAK_MB = 1.0
+
+
+def open_database(mongo_uri):
+    if mongo_uri:
+        client = ctr_db.connect(mongo_uri)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    client.drop_database(BENCH_DB_NAME)
+    return client[BENCH_DB_NAME]
+
+
+def stages(db, sch_date):
+    collection = db[ctr_db.CTR_COLLECTION]
+    query = ctr_db.ctr_query(None, sch_date)
+    projection = dict.fromkeys(ctr_db.TRAIN_COLUMNS, 1)
+    projection["_id"] = 0
+    frame = ctr_db.fetch_frame(collection, query, ctr_db.TRAIN_COLUMNS)
+    index = ctr_sections.SectionIndex(frame)
+    stations = synthetic.SDAH_STATIONS
+    pairs = [(a, b) for i, a in enumerate(stations) for b in stations[i + 1:]]
+    train = index.records[index.records["Train No"] == index.trains[0]]
+    # The first train's whole run as the section to chart
+    stn_a, stn_b = train["Stn"].iloc[0], train["Stn"].iloc[-1]
+    view = ctr_charts.section_speed_view(index, stn_a, stn_b)
+    return {
+        "catalog": lambda: ctr_db.load_date_catalog(db),
+        "query": lambda: list(collection.find(query, projection)),
+        "fetch_frame": lambda: ctr_db.fetch_frame(collection, query, ctr_db.TRAIN_COLUMNS),
+        "section_index": lambda: ctr_sections.SectionIndex(frame),
+        "section_extract": lambda: index.sections(pairs),
+        "section_view": lambda: ctr_charts.section_speed_view(index, stn_a, stn_b),
+        "running_times": lambda: ctr_times.running_times(frame),
+        "train_figure": lambda: ctr_charts.train_speed_figure(train),
+        "figure_json": lambda: plotly.io.to_json(view[1], validate=False),
+    }
+
+
+def measure(run, repeat):
+    # Warm up first so one-off imports and lazy setup don't count
+    run()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return {"seconds": round(best, 5), "peak_mb": round(peak / 2**20, 2)}
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["seconds"] > max(reference["seconds"] * tolerance, reference["seconds"] + MIN_SECONDS):
+            found.append(f"{name}: {result['seconds']:.4f}s vs baseline {reference['seconds']:.4f}s")
+        if result["peak_mb"] > max(reference["peak_mb"] * tolerance, reference["peak_mb"] + MIN_PEAK_MB):
+            found.append(f"{name}: {result['peak_mb']:.1f}MB vs baseline {reference['peak_mb']:.1f}MB")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dates", type=int, default=3)
+    parser.add_argument("--trains", type=int, default=400, help="trains per day")
+    parser.add_argument("--stations", type=int, default=18, help="stations per train")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = {"dates": args.dates, "trains": args.trains, "stations": args.stations,
+              "backend": "mongod" if args.mongo_uri else "mongomock"}
+    db = open_database(args.mongo_uri)
+    started = time.perf_counter()
+    synthetic.load(db, dates=args.dates, trains_per_day=args.trains, stations_per_train=args.stations)
+    print(f"loaded {db[ctr_db.CTR_COLLECTION].count_documents({})} records in {time.perf_counter() - started:.1f}s")
+
+    sch_date = max(db[ctr_db.CTR_COLLECTION].distinct("Sch date"))
+    results = {name: measure(run, args.repeat) for name, run in stages(db, sch_date).items()}
+    print(f"{'stage':<16}{'seconds':>10}{'peak MB':>10}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['seconds']:>10.4f}{result['peak_mb']:>10.2f}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "stages": results}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print(f"baseline was recorded for {baseline['config']}, not comparing")
+        return 0
+    found = regressions(results, baseline["stages"], args.tolerance)
+    for line in found:
+        print("REGRESSION", line)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
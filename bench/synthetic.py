@@ -0,0 +1,70 @@
+import datetime
+import random
+
+# Sealdah - Ranaghat main line, in down direction
+SDAH_STATIONS = (
+    "SDAH", "BNXR", "DDJ", "BLH", "AGP", "SEP", "KDH", "TGH", "BP", "PTF",
+    "IP", "SNR", "JGDL", "KNR", "NH", "HLR", "KPA", "KYI", "MDP", "SMX",
+    "PLP", "CDH", "PYD", "RHA",
+)
+
+
+def _clock(minutes):
+    return "%02d:%02d" % ((minutes // 60) % 24, minutes % 60)
+
+
+def ctr_records(dates=7, trains_per_day=400, stations_per_train=18, start=datetime.date(2024, 1, 1), seed=0):
+    """Yield synthetic CTR records shaped like CTR_DB documents.
+
+    Trains alternate up/down over a random stretch of SDAH_STATIONS and run
+    from early morning to past midnight; numeric fields are strings, as in
+    the exported data.
+    """
+    rnd = random.Random(seed)
+    stations_per_train = min(stations_per_train, len(SDAH_STATIONS))
+    for day in range(dates):
+        sch_date = (start + datetime.timedelta(days=day)).isoformat()
+        for train in range(trains_per_day):
+            first = rnd.randint(0, len(SDAH_STATIONS) - stations_per_train)
+            route = SDAH_STATIONS[first:first + stations_per_train]
+            if train % 2:
+                route = route[::-1]
+            minute = 3 * 60 + train * (21 * 60 // trains_per_day)
+            late = 0
+            for sl_no, stn in enumerate(route, 1):
+                late = max(late + rnd.randint(-1, 2), 0)
+                arrival, departure = minute, minute + 1
+                yield {
+                    "Train No": str(31000 + train),
+                    "Sch date": sch_date,
+                    "SL/No": str(sl_no),
+                    "Stn": stn,
+                    "S/Arr": _clock(arrival) if sl_no > 1 else "",
+                    "S/Dep": _clock(departure) if sl_no < len(route) else "",
+                    "A/Arr": _clock(arrival + late) if sl_no > 1 else "",
+                    "A/Dep": _clock(departure + late) if sl_no < len(route) else "",
+                    "Max Speed": str(rnd.randint(35, 100)),
+                }
+                minute += rnd.randint(3, 5)
+
+
+def section_distances(seed=0):
+    rnd = random.Random(seed)
+    return [
+        {"From": a, "To": b, "Distance": round(rnd.uniform(1.2, 4.5), 2)}
+        for a, b in zip(SDAH_STATIONS, SDAH_STATIONS[1:])
+    ]
+
+
+def load(db, batch_size=10000, **kwargs):
+    """Fill db.CTR_DB and db.Section_Distance with synthetic data."""
+    collection = db["CTR_DB"]
+    batch = []
+    for record in ctr_records(**kwargs):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+    db["Section_Distance"].insert_many(section_distances())
@@ -0,0 +1,345 @@
+import datetime
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import ctr_db
+import ctr_memo
+import ctr_metrics
+import ctr_sections
+import ctr_times
+
+# Bump when the cached representation changes, so old disk files are ignored
+FORMAT_VERSION = 2
+CATEGORY_COLUMNS = ("Train No", "Sch date", "Stn")
+COMPACT_DTYPES = {"SL/No": "Int16", "Max Speed": "float32"}
+
+
+def compact_frame(df):
+    """Shrink a CTR frame for caching.
+
+    Station codes, train numbers and dates become categoricals, SL/No and
+    Max Speed narrow numbers, and the time columns Int16 minutes after
+    midnight (ctr_times.format_minutes() turns them back into "HH:MM").
+    """
+    columns = {}
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            columns[column] = df[column].astype(str).astype("category")
+    for column, dtype in COMPACT_DTYPES.items():
+        if column in df:
+            columns[column] = df[column].astype(dtype)
+    for column in ctr_times.TIME_COLUMNS:
+        if column in df:
+            columns[column] = pd.array(ctr_times.parse_minutes(df[column]), dtype="Int16")
+    return df.assign(**columns)
+
+
+class DiskFrameCache:
+    """Per-Sch-date frames kept as Arrow IPC files under `directory`.
+
+    Files are read through a memory map, so worker processes on the same
+    host share the page cache instead of each holding its own copy. The
+    directory is kept under `max_bytes` by dropping the least recently read
+    files; reads bump the file's mtime. A file can carry the `version` of
+    the date it was written from (the catalog "updated" stamp); loading it
+    for another version is a miss, so a date rewritten elsewhere (ctr_ingest
+    on another host) isn't served from an old file.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sch_date, columns):
+        digest = hashlib.sha1("|".join((str(FORMAT_VERSION),) + tuple(columns)).encode()).hexdigest()[:12]
+        return os.path.join(self.directory, f"{sch_date}-{digest}.arrow")
+
+    def load(self, sch_date, columns, version=None):
+        path = self.path(sch_date, columns)
+        try:
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                if version is not None and (reader.schema.metadata or {}).get(b"ctr_version") != str(version).encode():
+                    return None
+                table = reader.read_all()
+            os.utime(path)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        return table.to_pandas(split_blocks=True)
+
+    def store(self, sch_date, columns, frame, version=None):
+        table = pa.Table.from_pandas(frame[list(columns)], preserve_index=False)
+        if version is not None:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"ctr_version": str(version).encode()})
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        # Atomic, so concurrent readers see either no file or a whole one.
+        os.replace(tmp, self.path(sch_date, columns))
+        self.evict()
+
+    def invalidate(self, sch_date):
+        """Drop every stored column set of `sch_date`."""
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(f"{sch_date}-") and entry.name.endswith(".arrow"):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".arrow"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def default_disk_cache():
+    """Disk cache configured by CTR_CACHE_DIR / CTR_CACHE_MAX_MB."""
+    directory = os.getenv("CTR_CACHE_DIR", ".ctr_cache")
+    max_mb = int(os.getenv("CTR_CACHE_MAX_MB", "2048"))
+    return DiskFrameCache(directory, max_mb * 1024 * 1024)
+
+
+def _key_rows(frame, column):
+    return ctr_sections.value_rows(*pd.factorize(frame[column]))
+
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+def _frame_bytes(frame):
+    # Compact frames are categoricals and numbers, so this stays cheap
+    return int(frame.memory_usage(deep=True).sum())
+
+
+class _Entry(ctr_memo.Entry):
+    def __init__(self):
+        super().__init__()
+        self.frame = None
+        self.nbytes = 0
+        self.watermark = None  # (watermark_field mark, _id mark)
+        self.closed = False
+        # version: catalog "updated" of the date when loaded
+
+
+class CTRFrameCache:
+    """In-process cache of CTR_DB query results as DataFrames.
+
+    A Sch date older than `open_days` days is closed: once loaded its result
+    is not refetched. Results touching an open date are refreshed at most
+    every `refresh_seconds` by pulling only the documents past the entry's
+    watermarks and merging them in by `_id`: new documents by `_id`, and
+    with a modification timestamp `watermark_field` (ctr_ingest stamps
+    "Updated") changed ones too. With a `catalog` (the date catalog
+    collection), a closed date is reloaded once its catalog row has been
+    rewritten, as ctr_ingest does for every date it loads. With a `disk`
+    cache, whole closed dates are also read from and written to disk, so
+    they survive restarts.
+
+    Frames are kept compacted (see compact_frame()), one per query, and
+    handed out as shallow views, so concurrent sessions share one copy of
+    the data. That relies on copy-on-write (the default from pandas 3; app.py
+    switches it on for older pandas), which keeps a caller's writes from
+    reaching the cached frame.
+
+    A train's or a station's records of a Sch date are a subset of the
+    date's records, so they are cut from the cached date frame through a
+    per-date row index; only dates not loaded yet go to Mongo.
+    """
+
+    def __init__(self, collection, columns, watermark_field="_id", open_days=1,
+                 refresh_seconds=60, max_entries=64, max_derived=128, disk=None, catalog=None):
+        self.collection = collection
+        self.columns = tuple(columns)
+        self.watermark_field = watermark_field
+        self.open_days = open_days
+        self.refresh_seconds = refresh_seconds
+        self.max_derived = max_derived
+        self.disk = disk
+        self.catalog = catalog
+        self._entries = ctr_memo.Entries(_Entry, max_entries)
+
+    def is_closed(self, sch_date):
+        if sch_date is None:
+            return False
+        cutoff = datetime.date.today() - datetime.timedelta(days=self.open_days)
+        return sch_date < cutoff.isoformat()
+
+    def _fetch_columns(self):
+        return tuple(dict.fromkeys(self.columns + ("_id", self.watermark_field)))
+
+    def _version(self, sch_date):
+        if self.catalog is None or sch_date is None:
+            return None
+        doc = self.catalog.find_one({"_id": sch_date}, {"updated": 1})
+        return None if doc is None else doc.get("updated")
+
+    def _marks(self, frame, previous):
+        # Latest watermark_field value and _id seen so far
+        marks = []
+        for field, mark in zip((self.watermark_field, "_id"), previous or (None, None)):
+            values = frame[field].dropna()
+            if not values.empty and (mark is None or values.max() > mark):
+                mark = values.max()
+            marks.append(mark)
+        return tuple(marks)
+
+    def _changes(self, watermark):
+        field_mark, id_mark = watermark
+        new = {"_id": {"$gt": id_mark}}
+        if self.watermark_field == "_id":
+            return new
+        # Documents without the field (not loaded by ctr_ingest) still show
+        # up by _id
+        changed = {self.watermark_field: {"$gt": field_mark} if field_mark is not None else {"$exists": True}}
+        return {"$or": [new, changed]}
+
+    def _refresh(self, entry, train_no, sch_date):
+        query = ctr_db.ctr_query(train_no, sch_date)
+        if entry.watermark is not None:
+            query.update(self._changes(entry.watermark))
+        entry.version = self._version(sch_date)
+        fresh = compact_frame(ctr_db.fetch_frame(self.collection, query, self._fetch_columns()))
+        entry.checked_at = time.monotonic()
+        entry.closed = self.is_closed(sch_date)
+        if entry.frame is None:
+            entry.frame = fresh
+        elif not fresh.empty:
+            kept = entry.frame[~entry.frame["_id"].isin(fresh["_id"])]
+            # Categories of the two parts differ, so re-compact the union
+            entry.frame = compact_frame(pd.concat([kept, fresh], ignore_index=True))
+        else:
+            return
+        entry.nbytes = _frame_bytes(entry.frame)
+        entry.watermark = self._marks(fresh, entry.watermark)
+        entry.forget_derived()
+
+    def _rewritten(self, entry, sch_date):
+        # A closed date changes only through ctr_ingest, which rewrites its
+        # catalog row; checked at most every refresh_seconds
+        entry.checked_at = time.monotonic()
+        if self.catalog is None or self._version(sch_date) == entry.version:
+            return False
+        entry.frame, entry.nbytes, entry.watermark, entry.closed = None, 0, None, False
+        entry.forget_derived()
+        if self.disk is not None:
+            self.disk.invalidate(sch_date)
+        return True
+
+    def _load_closed_date(self, entry, sch_date):
+        entry.version = self._version(sch_date)
+        entry.frame = self.disk.load(sch_date, self.columns, entry.version)
+        ctr_metrics.count("cache.disk_miss" if entry.frame is None else "cache.disk_hit")
+        if entry.frame is None:
+            self._refresh(entry, None, sch_date)
+            self.disk.store(sch_date, self.columns, entry.frame, entry.version)
+        entry.nbytes = _frame_bytes(entry.frame)
+        entry.closed = True
+        entry.checked_at = time.monotonic()
+
+    def _load(self, train_no, sch_date):
+        train_no = None if train_no is None else str(train_no)
+        entry = self._entries.get((train_no, sch_date))
+        with entry.lock:
+            stale = time.monotonic() - entry.checked_at >= self.refresh_seconds
+            if entry.frame is not None and entry.closed and stale and self._rewritten(entry, sch_date):
+                ctr_metrics.count("cache.rewritten")
+            if entry.frame is None:
+                ctr_metrics.count("cache.miss")
+            elif not entry.closed and stale:
+                ctr_metrics.count("cache.refresh")
+            else:
+                ctr_metrics.count("cache.hit")
+            if entry.frame is None and self.disk is not None and train_no is None and self.is_closed(sch_date):
+                self._load_closed_date(entry, sch_date)
+            elif entry.frame is None or (not entry.closed and stale):
+                self._refresh(entry, train_no, sch_date)
+        return entry
+
+    def warm(self, train_no=None, sch_date=None):
+        """Load a result ahead of use; a no-op when it is already fresh."""
+        # A train of a date is served from the date's frame
+        train_no = None if train_no is None or sch_date is not None else str(train_no)
+        entry = self._entries.peek((train_no, sch_date))
+        if (entry is not None and entry.frame is not None
+                and (entry.closed or time.monotonic() - entry.checked_at < self.refresh_seconds)):
+            return
+        self._load(train_no, sch_date)
+
+    def nbytes(self):
+        """Memory held by the cached frames (not by derived values)."""
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def get(self, train_no=None, sch_date=None, stn=None):
+        """Records of `train_no` and/or `sch_date` with the cache's columns.
+
+        With a `sch_date`, the records of a train and/or a station `stn` are
+        taken from the date's frame.
+        """
+        if sch_date is None:
+            if stn is not None:
+                raise ValueError("station records are looked up within a Sch date")
+            return self._load(train_no, None).frame[list(self.columns)]
+        entry = self._load(None, sch_date)
+        if train_no is None and stn is None:
+            return entry.frame[list(self.columns)]
+        with entry.lock:
+            rows = None
+            for column, value in (("Train No", train_no), ("Stn", stn)):
+                if value is not None:
+                    found = self.derived(None, sch_date, _key_rows, column).get(str(value), _NO_ROWS)
+                    rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            ctr_metrics.count("cache.subset")
+            return entry.frame.iloc[np.sort(rows)][list(self.columns)]
+
+    def fetch_uncached(self, sch_date):
+        """A date's records without keeping them in this cache.
+
+        Served from memory or disk when already there, otherwise straight
+        from Mongo; meant for scans over many dates.
+        """
+        entry = self._entries.peek((None, sch_date))
+        if entry is not None and entry.frame is not None:
+            return entry.frame[list(self.columns)]
+        if self.disk is not None and self.is_closed(sch_date):
+            frame = self.disk.load(sch_date, self.columns, self._version(sch_date))
+            if frame is not None:
+                return frame
+        return compact_frame(ctr_db.fetch_frame(self.collection, ctr_db.ctr_query(None, sch_date), self.columns))
+
+    def derived(self, train_no, sch_date, build, *args, base=None):
+        """build(frame, *args), memoised until the underlying result changes.
+
+        With `base`, build() gets the derived value of `base` (say, an index
+        of the frame) instead of the frame itself.
+        """
+        subset = train_no is not None and sch_date is not None
+        entry = self._load(None if subset else train_no, sch_date)
+        key = (build, args, base, str(train_no) if subset else None)
+
+        def make():
+            if base is None:
+                source = self.get(train_no, sch_date) if subset else entry.frame[list(self.columns)]
+            else:
+                source = self.derived(train_no, sch_date, base)
+            return build(source, *args)
+
+        return entry.derive(key, make, self.max_derived)
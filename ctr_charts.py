@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+import ctr_metrics
+import ctr_sections
+
+# Above this many points a scatter trace is drawn with WebGL instead of SVG.
+GL_THRESHOLD = 1000
+
+
+def _scatter(n_points, **kwargs):
+    trace = go.Scattergl if n_points > GL_THRESHOLD else go.Scatter
+    return trace(**kwargs)
+
+
+def train_speed_figure(records, station_max=None):
+    """Max Speed by station of one train, in SL/No order.
+
+    With `station_max` (Stn -> the day's highest Max Speed there) the day's
+    best at each station is drawn as a dotted line for comparison.
+    """
+    records = ctr_sections.sort_records(records)
+    stations = records["Stn"].to_numpy()
+    speeds = records["Max Speed"].to_numpy()
+    fig = go.Figure(data=[
+        _scatter(len(records), x=stations, y=speeds, text=speeds, textposition="top center", name="Train",
+                 mode="lines+markers+text", line=dict(color="cyan", width=1))
+    ])
+    if station_max is not None:
+        fig.add_trace(_scatter(len(records), x=stations, y=station_max.reindex(stations).to_numpy(),
+                               name="Day max", mode="lines", line=dict(color="orange", width=1, dash="dot")))
+    fig.update_layout(
+        title="Max Speed by Station",
+        paper_bgcolor="black",
+        plot_bgcolor="black",
+        font_color="white",
+        title_font=dict(size=24, color="white"),
+        xaxis=dict(showgrid=False, zeroline=False, categoryorder="array", categoryarray=pd.unique(stations)),
+        yaxis=dict(showgrid=False, zeroline=False),
+        xaxis_title="Station",
+        yaxis_title="Max Speed (Kmph)",
+        dragmode=False,  # Disable zoom
+        font=dict(size=17),
+        height=600,
+        width=1800
+    )
+    return fig
+
+
+def section_speed_view(index, stn_a, stn_b):
+    """(pivot, candlestick figure) of Max Speed between two stations.
+
+    The pivot has one row per train and one column per station, ordered
+    like the train with the most stops in the section. Returns None when no
+    train runs from A to B.
+    """
+    final_df = index.section(stn_a, stn_b)[["Train No", "Stn", "Max Speed"]]
+    if final_df.empty:
+        return None
+    # Plain labels, so the pivot's axes hold only stations and trains in the section
+    final_df = final_df.astype({"Train No": str, "Stn": str})
+    max_length_train_no = final_df.groupby("Train No", observed=True).size().idxmax()
+    stn_sequence = final_df[final_df["Train No"] == max_length_train_no]["Stn"].unique()
+    with ctr_metrics.span("pivot", rows=len(final_df)):
+        pivot_df = final_df.pivot(index="Train No", columns="Stn", values="Max Speed")
+        pivot_df = pivot_df.reindex(columns=stn_sequence)
+
+    grouped_df = ctr_sections.station_speed_stats(final_df)
+    n = len(grouped_df)
+    # Max/min/avg labels as one text trace rather than three annotations per station
+    labels = np.concatenate([grouped_df["Max Speed"], grouped_df["Min Speed"], grouped_df["Avg Speed"]])
+    fig = go.Figure(data=[
+        go.Candlestick(x=grouped_df["Stn"],
+                       open=grouped_df["Min Speed"],
+                       high=grouped_df["Max Speed"],
+                       low=grouped_df["Min Speed"],
+                       close=grouped_df["Avg Speed"],
+                       increasing_line_color="green", decreasing_line_color="red", showlegend=False),
+        go.Scatter(x=np.tile(grouped_df["Stn"].to_numpy(), 3), y=labels,
+                   text=[f"{value:.2f}" for value in labels], mode="text",
+                   textposition=["top center"] * n + ["bottom center"] * n + ["middle center"] * n,
+                   textfont=dict(color="white", size=12), hoverinfo="skip", showlegend=False),
+    ])
+    fig.update_layout(
+        title=f"Max Speed Chart Analysis between {stn_a} and {stn_b} :",
+        xaxis_title="Station",
+        yaxis_title="Speed (Kmph)",
+        xaxis=dict(categoryorder="array", categoryarray=stn_sequence, rangeslider=dict(visible=False)),
+        dragmode=False
+    )
+    return pivot_df, fig
+
+
+def speed_trend_figure(daily, stn_a, stn_b):
+    """Daily Max Speed per station, one line per station."""
+    # Trace type follows the total point count so all lines render alike
+    fig = go.Figure(data=[
+        _scatter(len(daily), x=rows["Sch date"], y=rows["max"], name=stn, mode="lines+markers")
+        for stn, rows in daily.groupby("Stn", sort=False, observed=True)
+    ])
+    fig.update_layout(
+        title=f"Daily Max Speed between {stn_a} and {stn_b}",
+        xaxis_title="Sch Date",
+        yaxis_title="Max Speed (Kmph)",
+        dragmode=False
+    )
+    return fig
+
+
+def lost_time_figure(summary):
+    """Total minutes lost per section, worst first."""
+    fig = go.Figure(data=[
+        go.Bar(x=summary["From"] + " → " + summary["To"], y=summary["Total Lost"],
+               text=summary["Total Lost"].round(1), textposition="outside",
+               marker_color=np.where(summary["Total Lost"] > 0, "red", "green"))
+    ])
+    fig.update_layout(
+        title="Sections with most time lost",
+        xaxis_title="Section",
+        yaxis_title="Total lost (min)",
+        dragmode=False
+    )
+    return fig
+
+
+def speed_box_figure(summary):
+    """Box per section from precomputed quantiles, whiskers at P10/P90."""
+    fig = go.Figure(data=[
+        go.Box(x=summary["Section"], q1=summary["P25"], median=summary["P50"], q3=summary["P75"],
+               lowerfence=summary["P10"], upperfence=summary["P90"], mean=summary["Avg Act Speed"],
+               marker_color="cyan", showlegend=False)
+    ])
+    fig.update_layout(
+        title="Actual sectional speed distribution (P10-P90)",
+        xaxis_title="Section",
+        yaxis_title="Speed (Kmph)",
+        dragmode=False
+    )
+    return fig
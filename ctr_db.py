@@ -0,0 +1,240 @@
+import datetime
+import os
+import time
+
+import pandas as pd
+import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+import ctr_metrics
+
+try:
+    # Optional: decodes BSON batches straight into Arrow columns.
+    from bson import ObjectId
+    from pymongoarrow.api import Schema, aggregate_arrow_all
+except ImportError:
+    aggregate_arrow_all = None
+
+DB_NAME = "CoachingInsights"
+CTR_COLLECTION = "CTR_DB"
+# Small per-date summary kept next to CTR_DB so the date picker never has to
+# touch the raw records.
+DATES_COLLECTION = "CTR_DB_dates"
+# Station-to-station distances in km: {"From", "To", "Distance"}
+DISTANCES_COLLECTION = "Section_Distance"
+# Permitted speed per section in Kmph: {"From", "To", "Limit"}; a section
+# applies in both directions unless the reverse has its own row.
+SPEED_LIMITS_COLLECTION = "Section_Speed_Limit"
+# Daily Max Speed rollups (see ctr_rollup): per (Sch date, Stn, Train No)
+# and per (Sch date, Stn)
+TRAIN_SPEED_COLLECTION = "CTR_DB_train_speed"
+STATION_SPEED_COLLECTION = "CTR_DB_station_speed"
+
+# Column sets the pages fetch
+TRAIN_COLUMNS = ("Train No", "Sch date", "SL/No", "Stn", "S/Arr", "S/Dep", "A/Arr", "A/Dep", "Max Speed")
+SECTION_COLUMNS = ("Train No", "SL/No", "Stn", "Max Speed")
+
+# Column types of a CTR record once fetched; everything else stays a string.
+NUMERIC_COLUMNS = {"SL/No": "Int64", "Max Speed": "float64"}
+FETCH_BATCH_SIZE = 5000
+# Numeric columns of CTR_DB, the rollups and the section tables. Older
+# documents store these as strings and newer ones as numbers.
+NUMBER_FIELDS = ("SL/No", "Max Speed", "Min Speed", "Avg Speed", "Trains", "Distance", "Limit")
+
+
+def client_options():
+    """Pool and timeout settings of the app's MongoClient.
+
+    One client is shared by every session of a process; page queries and
+    prefetch workers draw from its pool. Server selection fails after a few
+    seconds rather than pymongo's 30, so an unreachable cluster shows up as
+    an error instead of a hung page. CTR_MONGO_POOL_SIZE and
+    CTR_MONGO_TIMEOUT_MS override the defaults.
+    """
+    timeout_ms = int(os.getenv("CTR_MONGO_TIMEOUT_MS", "5000"))
+    return {
+        "maxPoolSize": int(os.getenv("CTR_MONGO_POOL_SIZE", "20")),
+        "minPoolSize": 0,
+        "maxIdleTimeMS": 300_000,
+        "serverSelectionTimeoutMS": timeout_ms,
+        "connectTimeoutMS": timeout_ms,
+        "socketTimeoutMS": 60_000,
+        "appname": "coaching-insights",
+    }
+
+
+def connect(uri, **options):
+    """A MongoClient with client_options(); `options` override them."""
+    return pymongo.MongoClient(uri, **{**client_options(), **options})
+
+
+def ping(client):
+    """Round trip to the server in seconds; raises PyMongoError if it's down."""
+    started = time.perf_counter()
+    client.admin.command("ping")
+    seconds = time.perf_counter() - started
+    ctr_metrics.record("mongo_ping", seconds)
+    return seconds
+
+
+def ctr_database(client):
+    return client[DB_NAME]
+
+
+def ctr_query(train_no=None, sch_date=None):
+    query = {}
+    if train_no is not None:
+        query["Train No"] = str(train_no)
+    if sch_date is not None:
+        query["Sch date"] = sch_date
+    return query
+
+
+def _arrow_query(query, columns):
+    # One explicit type per column, converted on the server: left to infer
+    # from the first document, pymongoarrow would turn every value of the
+    # other type into a null.
+    types, project = {}, {"_id": 0}
+    for column in columns:
+        if column == "_id":
+            types[column], project[column] = ObjectId, 1
+        elif column in ("Updated", "updated"):
+            types[column], project[column] = datetime.datetime, 1
+        else:
+            number = column in NUMBER_FIELDS
+            types[column] = float if number else str
+            project[column] = {"$convert": {"input": f"${column}", "to": "double" if number else "string",
+                                            "onError": None, "onNull": None}}
+    return [{"$match": query}, {"$project": project}], Schema(types)
+
+
+def fetch_frame(collection, query, columns):
+    """Fetch only `columns` of the matching CTR records as a typed DataFrame.
+
+    With pymongoarrow installed the cursor batches are decoded straight into
+    Arrow arrays, one declared type per column; otherwise documents are
+    streamed in batches into one list per column.
+    """
+    columns = list(columns)
+    projection = {column: 1 for column in columns}
+    projection.setdefault("_id", 0)
+    with ctr_metrics.span("fetch", collection=collection.name, columns=len(columns)):
+        if aggregate_arrow_all is not None:
+            pipeline, schema = _arrow_query(query, columns)
+            table = aggregate_arrow_all(collection, pipeline, schema=schema, batchSize=FETCH_BATCH_SIZE)
+        else:
+            data = {column: [] for column in columns}
+            cursor = collection.find(query, projection, batch_size=FETCH_BATCH_SIZE)
+            for doc in cursor:
+                for column in columns:
+                    data[column].append(doc.get(column))
+    with ctr_metrics.span("frame_build") as fields:
+        if aggregate_arrow_all is not None:
+            df = table.to_pandas().reindex(columns=columns)
+        else:
+            df = pd.DataFrame(data, columns=columns)
+        for column, dtype in NUMERIC_COLUMNS.items():
+            if column in df:
+                df[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+        fields["rows"] = len(df)
+    return df
+
+
+# Compound indexes of CTR_DB and the queries they back
+CTR_INDEXES = (
+    # distinct("Sch date"), per-date fetches and the catalog refresh
+    [("Sch date", 1), ("Train No", 1), ("Stn", 1)],
+    # per-train fetches and the ingest upsert key
+    [("Train No", 1), ("Sch date", 1), ("SL/No", 1)],
+    # station lookups within a date
+    [("Sch date", 1), ("Stn", 1)],
+)
+
+
+def ensure_indexes(collection):
+    try:
+        for keys in CTR_INDEXES:
+            collection.create_index(keys)
+    except OperationFailure:
+        # Read-only users can't create indexes; queries still work, just slower.
+        pass
+
+
+def refresh_date_catalog(db, sch_dates, rewritten=False):
+    """Recompute the catalog rows of the given Sch dates from CTR_DB.
+
+    A row is written, with a new "updated" stamp, only when its counts
+    changed, or for every date with `rewritten` (ctr_ingest, which may
+    change records in place). Caches key their copies of a date on that
+    stamp.
+    """
+    sch_dates = list(sch_dates)
+    if not sch_dates:
+        return []
+    pipeline = [
+        {"$match": {"Sch date": {"$in": sch_dates}}},
+        {"$group": {
+            "_id": "$Sch date",
+            "trains": {"$addToSet": "$Train No"},
+            "stations": {"$addToSet": "$Stn"},
+            "records": {"$sum": 1},
+        }},
+        {"$project": {
+            "trains": {"$size": "$trains"},
+            "stations": {"$size": "$stations"},
+            "records": 1,
+        }},
+    ]
+    rows = list(db[CTR_COLLECTION].aggregate(pipeline))
+    stored = {doc["_id"]: doc for doc in db[DATES_COLLECTION].find({"_id": {"$in": sch_dates}})}
+    updated = datetime.datetime.now(datetime.timezone.utc)
+    ops = [
+        UpdateOne(
+            {"_id": row["_id"]},
+            {"$set": {"trains": row["trains"], "stations": row["stations"],
+                      "records": row["records"], "updated": updated}},
+            upsert=True,
+        )
+        for row in rows
+        if rewritten or any(stored.get(row["_id"], {}).get(key) != row[key] for key in ("trains", "stations", "records"))
+    ]
+    if ops:
+        try:
+            db[DATES_COLLECTION].bulk_write(ops, ordered=False)
+        except OperationFailure:
+            pass
+    return rows
+
+
+def load_date_catalog(db):
+    """Available Sch dates with train/station/record counts, oldest first.
+
+    The date list itself comes from an index-backed distinct on CTR_DB; the
+    counts come from the catalog collection. Dates missing from the catalog
+    are recomputed on the way, and so is the latest (still filling) date
+    once an index-backed count of its records no longer matches its row.
+    """
+    ctr = db[CTR_COLLECTION]
+    known = set(ctr.distinct("Sch date"))
+    if not known:
+        return []
+    catalog = {doc["_id"]: doc for doc in db[DATES_COLLECTION].find()}
+    stale = known - catalog.keys()
+    latest = max(known)
+    if latest in catalog and ctr.count_documents({"Sch date": latest}) != catalog[latest].get("records"):
+        stale.add(latest)
+    if stale - catalog.keys():
+        ensure_indexes(ctr)
+    for row in refresh_date_catalog(db, stale):
+        catalog[row["_id"]] = row
+    return [
+        {
+            "Sch date": sch_date,
+            "Trains": catalog[sch_date]["trains"],
+            "Stations": catalog[sch_date]["stations"],
+            "Records": catalog[sch_date]["records"],
+        }
+        for sch_date in sorted(known)
+        if sch_date in catalog
+    ]
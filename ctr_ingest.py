@@ -0,0 +1,156 @@
+"""Bulk load CTR exports (CSV or Excel) into CoachingInsights.CTR_DB.
+
+    python ctr_ingest.py exports/ctr_2024-01-*.csv
+    python ctr_ingest.py ctr.xlsx --sheet CTR --mongo-uri mongodb://...
+
+Files are streamed in batches. Every batch is normalised (Sch date as
+YYYY-MM-DD, SL/No and Max Speed as numbers, times as HH:MM) and upserted
+in order on (Train No, Sch date, SL/No), so re-running an export replaces
+its rows instead of duplicating them; rows already stored with a string
+SL/No are matched too. The indexes the app relies on are
+created first; afterwards the date catalog, the Max Speed rollups and the
+on-disk cache of the touched dates are refreshed.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import pandas as pd
+from pymongo import UpdateOne
+
+import ctr_cache
+import ctr_db
+import ctr_rollup
+import ctr_times
+
+KEY_COLUMNS = ("Train No", "Sch date", "SL/No")
+REQUIRED_COLUMNS = KEY_COLUMNS + ("Stn",)
+
+
+def _excel_batches(path, batch_size, sheet):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = (workbook[sheet] if sheet else workbook.active).iter_rows(values_only=True)
+        header = ["" if cell is None else str(cell) for cell in next(rows, ())]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_batches(path, batch_size, sheet=None):
+    """Yield the rows of an export as DataFrames of at most `batch_size` rows."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        yield from _excel_batches(path, batch_size, sheet)
+    else:
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=batch_size)
+
+
+def _sch_dates(values):
+    values = values.astype(str).str.strip()
+    # ISO first, so 2024-01-05 isn't read day-first as 1 May
+    iso = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    other = pd.to_datetime(values, dayfirst=True, format="mixed", errors="coerce")
+    return iso.fillna(other).dt.strftime("%Y-%m-%d")
+
+
+def normalise(df):
+    """Typed CTR documents of one batch, and the number of rows dropped.
+
+    Rows without a usable Train No, Sch date, SL/No or Stn are dropped;
+    columns the app doesn't know are kept as stripped strings.
+    """
+    df = df.rename(columns=lambda column: str(column).strip())
+    missing = [column for column in REQUIRED_COLUMNS if column not in df]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    out = df.astype(str).apply(lambda column: column.str.strip())
+    out = out.where(df.notna(), None)
+    # Excel hands train numbers over as floats
+    out["Train No"] = out["Train No"].str.replace(r"\.0$", "", regex=True)
+    out["Sch date"] = _sch_dates(df["Sch date"])
+    out["SL/No"] = pd.to_numeric(out["SL/No"], errors="coerce").astype("Int64")
+    if "Max Speed" in out:
+        out["Max Speed"] = pd.to_numeric(out["Max Speed"], errors="coerce")
+    for column in ctr_times.TIME_COLUMNS:
+        if column in out:
+            out[column] = ctr_times.format_minutes(ctr_times.parse_minutes(df[column])).to_numpy()
+    valid = out[list(REQUIRED_COLUMNS)].notna().all(axis=1) & (out["Train No"] != "") & (out["Stn"] != "")
+    out = out[valid]
+    return out.astype(object).where(out.notna(), None), int((~valid).sum())
+
+
+def _key(doc):
+    # Documents loaded before this tool keep SL/No as a string; match either
+    # form, and the $set below rewrites it as a number
+    return {"Train No": doc["Train No"], "Sch date": doc["Sch date"],
+            "SL/No": {"$in": [doc["SL/No"], str(doc["SL/No"])]}}
+
+
+def upsert_batch(collection, docs, updated):
+    ops = [UpdateOne(_key(doc), {"$set": {**doc, "Updated": updated}}, upsert=True) for doc in docs]
+    return collection.bulk_write(ops, ordered=True)
+
+
+def ingest(db, paths, batch_size=5000, sheet=None, disk=None, report=print):
+    """Load `paths` into CTR_DB; returns the totals that are reported."""
+    collection = db[ctr_db.CTR_COLLECTION]
+    ctr_db.ensure_indexes(collection)
+    totals = {"rows": 0, "rejected": 0, "upserted": 0, "modified": 0, "seconds": 0.0}
+    sch_dates = set()
+    for path in paths:
+        started = time.perf_counter()
+        rows = 0
+        for batch in read_batches(path, batch_size, sheet):
+            frame, rejected = normalise(batch)
+            totals["rejected"] += rejected
+            if frame.empty:
+                continue
+            result = upsert_batch(collection, frame.to_dict("records"), datetime.datetime.now(datetime.timezone.utc))
+            rows += len(frame)
+            totals["upserted"] += result.upserted_count
+            totals["modified"] += result.modified_count
+            sch_dates.update(frame["Sch date"].unique())
+        seconds = time.perf_counter() - started
+        totals["rows"] += rows
+        totals["seconds"] += seconds
+        report(f"{path}: {rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):.0f} rows/s)")
+    ctr_db.refresh_date_catalog(db, sorted(sch_dates), rewritten=True)
+    ctr_rollup.refresh_rollups(db, sorted(sch_dates))
+    if disk is not None:
+        for sch_date in sch_dates:
+            disk.invalidate(sch_date)
+    totals["dates"] = len(sch_dates)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="CSV or Excel CTR exports")
+    parser.add_argument("--mongo-uri", default=os.getenv("mongo"), help="defaults to $mongo")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--sheet", help="Excel sheet name (default: the active sheet)")
+    args = parser.parse_args(argv)
+    if not args.mongo_uri:
+        parser.error("no --mongo-uri given and $mongo is not set")
+
+    db = ctr_db.ctr_database(ctr_db.connect(args.mongo_uri))
+    totals = ingest(db, args.paths, args.batch_size, args.sheet, disk=ctr_cache.default_disk_cache())
+    print(f"{totals['rows']} rows over {totals['dates']} Sch date(s) in {totals['seconds']:.1f}s "
+          f"({totals['rows'] / max(totals['seconds'], 1e-9):.0f} rows/s): "
+          f"{totals['upserted']} new, {totals['modified']} changed, {totals['rejected']} rejected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
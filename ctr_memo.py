@@ -0,0 +1,69 @@
+"""Entries of the in-process caches (ctr_cache, ctr_rollup).
+
+Both keep an LRU of entries, one per cached result, and memoise values
+derived from a result on its entry, so they live exactly as long as the
+result they come from.
+"""
+import threading
+from collections import OrderedDict
+
+import ctr_metrics
+
+
+class Entry:
+    """A cached result, with the values derived from it."""
+
+    def __init__(self):
+        # Re-entrant: a derived value may be built from another one
+        self.lock = threading.RLock()
+        self.version = None
+        self.checked_at = 0.0
+        self.derived = OrderedDict()
+
+    def forget_derived(self):
+        """Drop the derived values; call with the lock held, once the result changes."""
+        self.derived = OrderedDict()
+
+    def derive(self, key, make, max_derived):
+        """make(), memoised under `key`, keeping the `max_derived` latest values."""
+        with self.lock:
+            if key in self.derived:
+                ctr_metrics.count("derived.hit")
+                self.derived.move_to_end(key)
+                return self.derived[key]
+            ctr_metrics.count("derived.miss")
+            value = self.derived[key] = make()
+            while len(self.derived) > max_derived:
+                self.derived.popitem(last=False)
+            return value
+
+
+class Entries:
+    """At most `max_entries` entries made by `factory`, least recently used dropped first."""
+
+    def __init__(self, factory, max_entries):
+        self.factory = factory
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The entry of `key`, made if missing."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = self.factory()
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            return entry
+
+    def peek(self, key):
+        """The entry of `key` if there is one, without making or touching it."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
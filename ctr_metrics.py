@@ -0,0 +1,150 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import bson
+from pymongo import monitoring
+
+# One JSON object per line: {"event": "span" | "rerun", ...}
+logger = logging.getLogger("ctr.metrics")
+
+_lock = threading.Lock()
+_totals = defaultdict(lambda: [0, 0.0, 0.0])  # name -> [count, seconds, max seconds]
+_counters = defaultdict(int)
+_local = threading.local()
+# The app imports this module first thing, so this is when a worker process
+# started running the script.
+_imported_at = time.perf_counter()
+_first_render = None
+
+
+def log_to_stderr(level=logging.INFO):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def _emit(event, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def record(name, seconds, **fields):
+    """Account one timed stage; `fields` go into its log line."""
+    with _lock:
+        total = _totals[name]
+        total[0] += 1
+        total[1] += seconds
+        total[2] = max(total[2], seconds)
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.spans.append((name, seconds, fields))
+    _emit("span", name=name, ms=round(seconds * 1000, 2), **fields)
+
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """Time the block as stage `name`; the block may add to the yielded fields."""
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record(name, time.perf_counter() - started, **fields)
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.counters[name] += n
+
+
+class Run:
+    """Spans and counters of one script rerun on one thread.
+
+    With `measure_bytes`, Mongo replies on the thread are re-encoded to count
+    their bytes; that costs about as much as decoding them, so it is only
+    done for runs someone is looking at.
+    """
+
+    def __init__(self, measure_bytes=False, **fields):
+        self.measure_bytes = measure_bytes
+        self.fields = fields
+        self.spans = []
+        self.counters = defaultdict(int)
+        self.seconds = 0.0
+
+
+@contextlib.contextmanager
+def collect(measure_bytes=False, **fields):
+    """Gather everything recorded on this thread into a Run."""
+    run = Run(measure_bytes, **fields)
+    previous = getattr(_local, "run", None)
+    _local.run = run
+    started = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run.seconds = time.perf_counter() - started
+        _local.run = previous
+        _emit("rerun", ms=round(run.seconds * 1000, 2), counters=dict(run.counters),
+              spans=[[name, round(seconds * 1000, 2)] for name, seconds, _ in run.spans], **fields)
+
+
+def restart_first_render_clock():
+    """Time first_render() from now rather than from this module's import.
+
+    For harnesses that import this module, then spend a while setting up
+    (loading data, say) before running the app.
+    """
+    global _imported_at, _first_render
+    with _lock:
+        _imported_at = time.perf_counter()
+        _first_render = None
+
+
+def first_render():
+    """Seconds from import to the first finished rerun, recorded once per process."""
+    global _first_render
+    with _lock:
+        if _first_render is not None:
+            return _first_render
+        _first_render = time.perf_counter() - _imported_at
+    record("first_render", _first_render)
+    return _first_render
+
+
+def totals():
+    """Process-wide (stage -> (count, seconds, max seconds)) and counters."""
+    with _lock:
+        return {name: tuple(total) for name, total in _totals.items()}, dict(_counters)
+
+
+class CommandListener(monitoring.CommandListener):
+    """Records every Mongo command as a "mongo.<command>" span.
+
+    Pass to MongoClient(event_listeners=[...]); events fire on the thread
+    that ran the command, so they land in that thread's Run.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        fields = {}
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor is not None:
+            fields["docs"] = len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+        run = getattr(_local, "run", None)
+        if run is not None and run.measure_bytes:
+            fields["bytes"] = len(bson.encode(event.reply))
+        record(f"mongo.{event.command_name}", event.duration_micros / 1e6, **fields)
+
+    def failed(self, event):
+        record(f"mongo.{event.command_name}", event.duration_micros / 1e6, error=str(event.failure))
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+import ctr_db
+import ctr_metrics
+import ctr_sections
+
+VIOLATION_COLUMNS = ("Sch date", "Train No", "SL/No", "From", "Stn", "Max Speed", "Limit", "Excess")
+
+
+def load_speed_limits(collection):
+    """Section speed limit table from Section_Speed_Limit, both directions."""
+    df = ctr_db.fetch_frame(collection, {}, ("From", "To", "Limit"))
+    df = df.assign(Limit=pd.to_numeric(df["Limit"], errors="coerce")).dropna(subset=["Limit"])
+    reverse = df.rename(columns={"From": "To", "To": "From"})
+    both = pd.concat([df, reverse], ignore_index=True)
+    return both.drop_duplicates(["From", "To"], keep="first")[["From", "To", "Limit"]]
+
+
+def scan_overspeed(records, limits, default_limit=None, tolerance=0.0):
+    """Records whose Max Speed is over the limit of the section they close.
+
+    A record's Max Speed is checked against the limit of the hop from the
+    train's previous station to the record's station; hops without a limit
+    use `default_limit`, or are not checked when that is None. Speeds up to
+    `tolerance` Kmph over the limit pass.
+    """
+    if records.empty:
+        return pd.DataFrame(columns=list(VIOLATION_COLUMNS))
+    # Runs of the same Train No on several dates are separate runs
+    records = records.sort_values(["Sch date", "Train No", "SL/No"], kind="stable", ignore_index=True)
+    train_codes = records.groupby(["Sch date", "Train No"], sort=False, observed=True).ngroup().to_numpy()
+    stations = records["Stn"].astype(str).to_numpy()
+    previous = np.concatenate([[None], stations[:-1]]).astype(object)
+    first = np.flatnonzero(np.diff(train_codes, prepend=-1) != 0)
+    previous[first] = None
+    hops = pd.DataFrame({"From": previous, "To": stations})
+    limit = hops.merge(limits, on=["From", "To"], how="left")["Limit"].to_numpy(dtype=float)
+    if default_limit is not None:
+        limit = np.where(np.isnan(limit), default_limit, limit)
+        # A train's first record closes no hop
+        limit[first] = np.nan
+    speed = records["Max Speed"].to_numpy(dtype=float, na_value=np.nan)
+    over = np.flatnonzero(speed > limit + tolerance)
+    violations = pd.DataFrame({
+        "Sch date": records["Sch date"].astype(str).to_numpy()[over],
+        "Train No": records["Train No"].astype(str).to_numpy()[over],
+        "SL/No": records["SL/No"].to_numpy()[over],
+        "From": previous[over],
+        "Stn": stations[over],
+        "Max Speed": speed[over],
+        "Limit": limit[over],
+    })
+    violations["Excess"] = violations["Max Speed"] - violations["Limit"]
+    return violations
+
+
+class ViolationIndex:
+    """Overspeed violations of one or more dates, indexed for drill-down.
+
+    Rows are kept in (Sch date, Train No, SL/No) order with the row
+    positions of every date, train and station, so a lookup only
+    intersects small position arrays instead of filtering the whole table.
+    """
+
+    KEYS = ("Sch date", "Train No", "Stn")
+
+    def __init__(self, violations):
+        with ctr_metrics.span("violation_index", rows=len(violations)):
+            self.violations = violations.sort_values(["Sch date", "Train No", "SL/No"], kind="stable",
+                                                     ignore_index=True)
+            self._rows = {key: ctr_sections.value_rows(*pd.factorize(self.violations[key])) for key in self.KEYS}
+
+    def values(self, key):
+        """Distinct values of "Sch date", "Train No" or "Stn" with a violation."""
+        return sorted(self._rows[key])
+
+    def lookup(self, sch_date=None, train_no=None, stn=None):
+        """Violations matching every given date/train/station."""
+        rows = None
+        for key, value in zip(self.KEYS, (sch_date, train_no, stn)):
+            if value is None:
+                continue
+            found = self._rows[key].get(str(value), np.empty(0, dtype=np.intp))
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        if rows is None:
+            return self.violations
+        return self.violations.iloc[np.sort(rows)]
+
+    def counts(self, key):
+        """Violations, trains and worst excess per `key`, most violations first."""
+        grouped = self.violations.groupby(key, sort=False)
+        summary = grouped.agg(Violations=("Excess", "size"), Trains=("Train No", "nunique"),
+                              **{"Max Excess": ("Excess", "max")})
+        return summary.sort_values("Violations", ascending=False).reset_index()
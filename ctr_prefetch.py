@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ctr_metrics
+
+
+class _Batch:
+    def __init__(self, key):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.futures = []
+
+
+class Prefetcher:
+    """Warms caches in the background on a small, shared thread pool.
+
+    Every owner (a browser session, say) has at most one batch of jobs in
+    flight: scheduling a new selection cancels the jobs of the previous one
+    that haven't started yet. Jobs are skipped once `usage()` reports
+    `max_bytes` or more in use, and no more than `max_pending` jobs are
+    queued across all owners, so prefetching never crowds out the pages.
+    """
+
+    def __init__(self, max_workers=2, max_bytes=None, usage=None, max_pending=32):
+        self.max_bytes = max_bytes
+        self.usage = usage
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ctr-prefetch")
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def _over_budget(self):
+        return self.max_bytes is not None and self.usage is not None and self.usage() >= self.max_bytes
+
+    def _run(self, batch, job, args):
+        if batch.cancelled.is_set():
+            ctr_metrics.count("prefetch.cancelled")
+            return
+        if self._over_budget():
+            ctr_metrics.count("prefetch.over_budget")
+            return
+        try:
+            with ctr_metrics.span("prefetch", job=getattr(job, "__name__", repr(job)), args=args):
+                job(*args)
+        except Exception:
+            # Nothing is waiting on a prefetch; the page will fetch it again
+            ctr_metrics.count("prefetch.error")
+        else:
+            ctr_metrics.count("prefetch.done")
+
+    def _pending(self, owner):
+        # Forget finished batches of other owners (sessions come and go)
+        for other, batch in list(self._batches.items()):
+            if other != owner and all(future.done() for future in batch.futures):
+                del self._batches[other]
+        return sum(not future.done() for batch in self._batches.values() for future in batch.futures)
+
+    def schedule(self, owner, key, jobs):
+        """Run `jobs` ((callable, args) pairs) for `owner`'s selection `key`.
+
+        Rescheduling the same key is a no-op, so this can be called on
+        every rerun.
+        """
+        with self._lock:
+            current = self._batches.get(owner)
+            if current is not None and current.key == key:
+                return
+            if current is not None:
+                self._cancel(current)
+            batch = self._batches[owner] = _Batch(key)
+            room = self.max_pending - self._pending(owner)
+            for job, args in list(jobs)[:max(room, 0)]:
+                batch.futures.append(self._executor.submit(self._run, batch, job, args))
+
+    def _cancel(self, batch):
+        batch.cancelled.set()
+        for future in batch.futures:
+            if future.cancel():
+                ctr_metrics.count("prefetch.cancelled")
+
+    def cancel(self, owner):
+        with self._lock:
+            batch = self._batches.pop(owner, None)
+            if batch is not None:
+                self._cancel(batch)
+
+    def shutdown(self):
+        with self._lock:
+            for batch in self._batches.values():
+                self._cancel(batch)
+            self._batches.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+import ctr_sections
+import ctr_times
+
+RANGE_QUANTILES = (0.1, 0.5, 0.9, 0.99)
+
+
+class HistogramSketch:
+    """Count/min/max/mean and quantiles of a value per key, in fixed memory.
+
+    Values are binned into `bin_width` buckets over [lo, hi) (out-of-range
+    values land in the edge buckets), so quantiles are exact to one bucket
+    and memory depends only on the number of keys, never on how many values
+    were folded in.
+    """
+
+    def __init__(self, lo, hi, bin_width):
+        self.lo = lo
+        self.bin_width = bin_width
+        self.bins = int(np.ceil((hi - lo) / bin_width))
+        self.keys = {}
+        self.counts = np.zeros((0, self.bins), dtype=np.int64)
+        self.total = np.zeros(0)
+        self.low = np.zeros(0)
+        self.high = np.zeros(0)
+
+    def _key_codes(self, keys):
+        new = [key for key in pd.unique(keys) if key not in self.keys]
+        if new:
+            for key in new:
+                self.keys[key] = len(self.keys)
+            grow = len(new)
+            self.counts = np.vstack([self.counts, np.zeros((grow, self.bins), dtype=np.int64)])
+            self.total = np.concatenate([self.total, np.zeros(grow)])
+            self.low = np.concatenate([self.low, np.full(grow, np.inf)])
+            self.high = np.concatenate([self.high, np.full(grow, -np.inf)])
+        return pd.Index(list(self.keys)).get_indexer(keys)
+
+    def update(self, keys, values):
+        values = np.asarray(values, dtype=float)
+        keep = ~np.isnan(values)
+        keys, values = np.asarray(keys, dtype=object)[keep], values[keep]
+        if not len(values):
+            return
+        codes = self._key_codes(keys)
+        buckets = np.clip(((values - self.lo) // self.bin_width).astype(np.intp), 0, self.bins - 1)
+        flat = np.bincount(codes * self.bins + buckets, minlength=self.counts.size)
+        self.counts += flat.reshape(self.counts.shape)
+        np.add.at(self.total, codes, values)
+        np.minimum.at(self.low, codes, values)
+        np.maximum.at(self.high, codes, values)
+
+    def summary(self, quantiles=RANGE_QUANTILES):
+        n = self.counts.sum(axis=1)
+        frame = pd.DataFrame({"Count": n, "Min": self.low, "Max": self.high,
+                              "Mean": self.total / np.maximum(n, 1)}, index=list(self.keys))
+        cumulative = self.counts.cumsum(axis=1)
+        for q in quantiles:
+            # First bucket whose cumulative count reaches the rank; report its
+            # lower edge, which is exact for values on the bucket grid
+            rank = np.ceil(q * n).clip(min=1)[:, None]
+            bucket = (cumulative < rank).sum(axis=1)
+            frame[f"P{q * 100:g}"] = self.lo + bucket * self.bin_width
+        return frame
+
+
+def iter_date_frames(load, sch_dates):
+    """Yield (sch_date, records) one date at a time; `load` fetches a date."""
+    for sch_date in sch_dates:
+        yield sch_date, load(sch_date)
+
+
+def section_range_stats(frames, stn_a, stn_b):
+    """Fold each date's A -> B runs into per-station and per-section sketches.
+
+    Returns (stations, sections, daily): quantiles of Max Speed per station,
+    of actual running minutes per hop, and a small per-date, per-station
+    mean/max table for trend charts. Only one date's records are held at a
+    time.
+    """
+    stations = HistogramSketch(0, 200, 1)
+    sections = HistogramSketch(0, 120, 0.5)
+    daily = []
+    for sch_date, records in frames:
+        run = ctr_sections.extract_section(records, stn_a, stn_b)
+        if run.empty:
+            continue
+        stations.update(run["Stn"], run["Max Speed"])
+        if set(ctr_times.TIME_COLUMNS) <= set(run.columns):
+            hops = ctr_times.running_times(run)
+            sections.update(hops["From"] + " → " + hops["To"], hops["Act Run"])
+        day = run.groupby("Stn", sort=False, observed=True)["Max Speed"].agg(["mean", "max"]).reset_index()
+        daily.append(day.assign(**{"Sch date": sch_date}))
+    daily = pd.concat(daily, ignore_index=True) if daily else pd.DataFrame(columns=["Stn", "mean", "max", "Sch date"])
+    return stations.summary(), sections.summary(), daily
@@ -0,0 +1,167 @@
+"""Headless CTR reports for a range of Sch dates.
+
+    python ctr_report.py 2024-01-01 2024-01-31 --pair SDAH:BLH --pair SDAH:KYI
+    python ctr_report.py 2024-01-01 2024-01-31 --analysis trains --format csv --out reports/
+
+Runs the same analyses as the app's pages, one Sch date per task on a
+process pool, and writes one file per analysis (all dates together) to
+--out. Importable as well:
+
+    results = ctr_report.run_report(uri, sch_dates, pairs=[("SDAH", "BLH")])
+    ctr_report.write_report(results, "reports", "parquet")
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import ctr_db
+import ctr_metrics
+import ctr_sections
+import ctr_speed
+import ctr_times
+
+
+def train_speeds(records, pairs, distances):
+    """Max Speed (Trains): every train's records in SL/No order."""
+    records = ctr_sections.sort_records(records)
+    return records.assign(**{column: ctr_times.format_minutes(ctr_times.parse_minutes(records[column]))
+                             for column in ctr_times.TIME_COLUMNS})
+
+
+def section_speeds(records, pairs, distances):
+    """Max Speed (Sections): per-station max/min/avg over the trains of each pair."""
+    rows = ctr_sections.extract_sections(records, pairs)
+    return ctr_sections.station_speed_stats(rows, by=("Stn_A", "Stn_B", "Stn"))
+
+
+def section_times(records, pairs, distances):
+    """Sectionwise Time: scheduled vs actual running time per section."""
+    return ctr_times.section_summary(ctr_times.running_times(records))
+
+
+def sectional_speeds(records, pairs, distances):
+    """Sectional Speed: scheduled and actual speed of every hop."""
+    return ctr_speed.sectional_speeds(ctr_times.running_times(records), distances)
+
+
+# Report name -> analysis(records of one date, station pairs, distances)
+ANALYSES = {
+    "trains": train_speeds,
+    "sections": section_speeds,
+    "section_times": section_times,
+    "sectional_speeds": sectional_speeds,
+}
+
+# One client per worker process, made by _init_worker()
+_db = None
+
+
+def _init_worker(mongo_uri):
+    global _db
+    _db = ctr_db.ctr_database(ctr_db.connect(mongo_uri))
+
+
+def report_date(db, sch_date, pairs, analyses, distances=None):
+    """{analysis: frame} of one Sch date; every frame gets a "Sch date" column."""
+    if distances is None and "sectional_speeds" in analyses:
+        distances = ctr_speed.load_distances(db[ctr_db.DISTANCES_COLLECTION])
+    records = ctr_db.fetch_frame(db[ctr_db.CTR_COLLECTION], ctr_db.ctr_query(None, sch_date), ctr_db.TRAIN_COLUMNS)
+    results = {}
+    for name in analyses:
+        with ctr_metrics.span("report", analysis=name, sch_date=sch_date):
+            frame = ANALYSES[name](records, pairs, distances)
+        results[name] = frame.assign(**{"Sch date": sch_date})
+    return results
+
+
+def _report_date(sch_date, pairs, analyses, distances):
+    return report_date(_db, sch_date, pairs, analyses, distances)
+
+
+def report_dates(db, start, end):
+    """Sch dates with records between `start` and `end` (YYYY-MM-DD, inclusive)."""
+    return sorted(db[ctr_db.CTR_COLLECTION].distinct("Sch date", {"Sch date": {"$gte": start, "$lte": end}}))
+
+
+def run_report(mongo_uri, sch_dates, pairs=(), analyses=tuple(ANALYSES), workers=None):
+    """{analysis: frame over all `sch_dates`}, one date per worker task."""
+    analyses = tuple(analyses)
+    unknown = set(analyses) - ANALYSES.keys()
+    if unknown:
+        raise ValueError(f"unknown analyses: {', '.join(sorted(unknown))}")
+    pairs = [tuple(pair) for pair in pairs]
+    if "sections" in analyses and not pairs:
+        raise ValueError("the sections analysis needs at least one station pair")
+    distances = None
+    if "sectional_speeds" in analyses:
+        db = ctr_db.ctr_database(ctr_db.connect(mongo_uri))
+        distances = ctr_speed.load_distances(db[ctr_db.DISTANCES_COLLECTION])
+    parts = {name: [] for name in analyses}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mongo_uri,)) as pool:
+        tasks = [pool.submit(_report_date, sch_date, pairs, analyses, distances) for sch_date in sch_dates]
+        for task in tasks:
+            for name, frame in task.result().items():
+                parts[name].append(frame)
+    return {name: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            for name, frames in parts.items()}
+
+
+def write_report(results, out_dir, fmt="parquet"):
+    """Write each analysis to out_dir/<analysis>.<fmt>; returns the paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, frame in results.items():
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "parquet":
+            frame.to_parquet(path, index=False)
+        else:
+            frame.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def _pair(value):
+    stn_a, sep, stn_b = value.partition(":")
+    if not sep or not stn_a or not stn_b:
+        raise argparse.ArgumentTypeError(f"expected STN_A:STN_B, got {value!r}")
+    return stn_a.strip().upper(), stn_b.strip().upper()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("start", help="first Sch date, YYYY-MM-DD")
+    parser.add_argument("end", help="last Sch date, YYYY-MM-DD")
+    parser.add_argument("--pair", action="append", type=_pair, default=[], metavar="STN_A:STN_B",
+                        help="station pair for the sections analysis; repeatable")
+    parser.add_argument("--analysis", action="append", choices=list(ANALYSES),
+                        help="analysis to run; repeatable (default: all, sections only with --pair)")
+    parser.add_argument("--out", default="reports", help="output directory (default: reports)")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--mongo-uri", default=os.getenv("mongo"), help="defaults to $mongo")
+    args = parser.parse_args(argv)
+    if not args.mongo_uri:
+        parser.error("no --mongo-uri given and $mongo is not set")
+    analyses = args.analysis or [name for name in ANALYSES if name != "sections" or args.pair]
+
+    started = time.perf_counter()
+    sch_dates = report_dates(ctr_db.ctr_database(ctr_db.connect(args.mongo_uri)), args.start, args.end)
+    if not sch_dates:
+        print(f"No CTR records between {args.start} and {args.end}.", file=sys.stderr)
+        return 1
+    try:
+        results = run_report(args.mongo_uri, sch_dates, args.pair, analyses, args.workers)
+    except ValueError as error:
+        parser.error(str(error))
+    for path in write_report(results, args.out, args.format):
+        print(path)
+    print(f"{len(sch_dates)} Sch date(s) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
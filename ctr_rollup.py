@@ -0,0 +1,208 @@
+"""Daily Max Speed rollups kept next to CTR_DB.
+
+Two small collections are maintained per Sch date:
+
+* TRAIN_SPEED_COLLECTION: one document per (Sch date, Stn, Train No) with
+  the train's SL/No at the station and its Max Speed there;
+* STATION_SPEED_COLLECTION: one document per (Sch date, Stn) with the
+  number of trains and the max/min/mean of their Max Speed.
+
+A date is rolled up again only when its record count in the date catalog
+no longer matches the count it was rolled up from (new data landed), or
+when ctr_ingest rewrites it.
+"""
+import datetime
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+import ctr_db
+import ctr_memo
+import ctr_metrics
+import ctr_sections
+
+ROLLUP_COLUMNS = ("Train No", "Sch date", "SL/No", "Stn", "Max Speed")
+TRAIN_SPEED_COLUMNS = ("Train No", "SL/No", "Stn", "Max Speed")
+STATION_SPEED_COLUMNS = ("Stn", "Trains", "Max Speed", "Min Speed", "Avg Speed")
+
+
+def build_rollups(records):
+    """(per-train, per-station) Max Speed rollups of CTR records.
+
+    A train that passes a station more than once keeps its first SL/No and
+    its highest speed there; station figures are over one value per train.
+    """
+    keys = ["Sch date", "Stn", "Train No"]
+    trains = records.astype({column: str for column in keys}).groupby(keys, sort=False).agg(
+        **{"SL/No": ("SL/No", "min"), "Max Speed": ("Max Speed", "max")}
+    ).reset_index()
+    stations = trains.groupby(["Sch date", "Stn"], sort=False).agg(
+        Trains=("Train No", "nunique"),
+        **{
+            "Max Speed": ("Max Speed", "max"),
+            "Min Speed": ("Max Speed", "min"),
+            "Avg Speed": ("Max Speed", "mean"),
+        },
+    ).reset_index()
+    return trains, stations
+
+
+def _documents(frame, key_columns, updated):
+    docs = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    for doc in docs:
+        doc["_id"] = "|".join(doc[column] for column in key_columns)
+        doc["updated"] = updated
+    return docs
+
+
+def _replace(collection, sch_date, docs, updated):
+    collection.create_index([("Sch date", 1), ("Stn", 1)])
+    if docs:
+        collection.bulk_write([UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True) for doc in docs],
+                              ordered=False)
+    # Keys this pass didn't write are gone from CTR_DB. Deleted by key, and
+    # only if written before this pass, so a refresh of the same date running
+    # alongside (the app and ctr_ingest, or two workers) keeps its rows.
+    collection.delete_many({"Sch date": sch_date, "_id": {"$nin": [doc["_id"] for doc in docs]},
+                            "updated": {"$lt": updated}})
+
+
+def refresh_rollups(db, sch_dates):
+    """Recompute the rollups of the given Sch dates from CTR_DB.
+
+    Returns {sch_date: (trains, stations)}; the frames are returned even
+    when the rollups can't be written (read-only user).
+    """
+    rollups = {}
+    for sch_date in sch_dates:
+        with ctr_metrics.span("rollup", sch_date=sch_date) as fields:
+            records = ctr_db.fetch_frame(db[ctr_db.CTR_COLLECTION], ctr_db.ctr_query(None, sch_date), ROLLUP_COLUMNS)
+            trains, stations = rollups[sch_date] = build_rollups(records)
+            fields["records"] = len(records)
+            updated = datetime.datetime.now(datetime.timezone.utc)
+            try:
+                _replace(db[ctr_db.TRAIN_SPEED_COLLECTION], sch_date,
+                         _documents(trains, ("Sch date", "Stn", "Train No"), updated), updated)
+                _replace(db[ctr_db.STATION_SPEED_COLLECTION], sch_date,
+                         _documents(stations, ("Sch date", "Stn"), updated), updated)
+                # Only on an existing catalog row; load_date_catalog() makes those
+                db[ctr_db.DATES_COLLECTION].update_one(
+                    {"_id": sch_date}, {"$set": {"rolled_up": len(records), "rolled_up_at": updated}})
+            except OperationFailure:
+                pass
+    return rollups
+
+
+def stale_dates(db, sch_dates=None):
+    """Sch dates whose rollups are missing or out of date.
+
+    Without `sch_dates`, every catalogued date is checked. A date with no
+    catalog row, or one never rolled up (say, for a read-only user, who
+    can't record it), is stale.
+    """
+    query = {} if sch_dates is None else {"_id": {"$in": list(sch_dates)}}
+    catalog = {doc["_id"]: doc for doc in db[ctr_db.DATES_COLLECTION].find(query, {"records": 1, "rolled_up": 1})}
+    stale = []
+    for sch_date in catalog if sch_dates is None else set(sch_dates):
+        doc = catalog.get(sch_date, {})
+        if doc.get("rolled_up") is None or doc["rolled_up"] != doc.get("records"):
+            stale.append(sch_date)
+    return sorted(stale)
+
+
+def load_rollups(db, sch_date):
+    """(per-train, per-station) rollups of one Sch date, refreshed if stale."""
+    if stale_dates(db, [sch_date]):
+        trains, stations = refresh_rollups(db, [sch_date])[sch_date]
+        return trains[list(TRAIN_SPEED_COLUMNS)], stations[list(STATION_SPEED_COLUMNS)]
+    query = ctr_db.ctr_query(None, sch_date)
+    trains = ctr_db.fetch_frame(db[ctr_db.TRAIN_SPEED_COLLECTION], query, TRAIN_SPEED_COLUMNS)
+    stations = ctr_db.fetch_frame(db[ctr_db.STATION_SPEED_COLLECTION], query, STATION_SPEED_COLUMNS)
+    return trains, stations
+
+
+def section_index(rollups):
+    """Station/train index of a day's per-train rollup, for RollupCache.derived()."""
+    return ctr_sections.SectionIndex(rollups[0])
+
+
+def station_max(rollups):
+    """Stn -> the day's highest Max Speed there, for RollupCache.derived()."""
+    return rollups[1].set_index("Stn")["Max Speed"]
+
+
+class _Entry(ctr_memo.Entry):
+    def __init__(self):
+        super().__init__()
+        self.rollups = None
+
+
+class RollupCache:
+    """load_rollups() per Sch date, with values derived from them.
+
+    An entry is checked against the date's catalog row at most every
+    `refresh_seconds` and reloaded only when the row has moved on (new
+    records, or new rollups), so a closed date and everything derived from
+    it are kept as long as they are in the cache. Shared by all sessions
+    and safe to fill from background threads; values are handed out as is
+    and must not be modified.
+    """
+
+    def __init__(self, db, refresh_seconds=60, max_entries=64, max_derived=128):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.max_derived = max_derived
+        self._entries = ctr_memo.Entries(_Entry, max_entries)
+
+    def _version(self, sch_date):
+        doc = self.db[ctr_db.DATES_COLLECTION].find_one(
+            {"_id": sch_date}, {"records": 1, "rolled_up": 1, "rolled_up_at": 1})
+        return None if doc is None else (doc.get("records"), doc.get("rolled_up"), doc.get("rolled_up_at"))
+
+    def _load(self, sch_date):
+        entry = self._entries.get(sch_date)
+        with entry.lock:
+            if entry.rollups is not None and time.monotonic() - entry.checked_at < self.refresh_seconds:
+                ctr_metrics.count("rollup.hit")
+                return entry
+            # Read first: a change landing while the rollups load shows up
+            # on the next check
+            version = self._version(sch_date)
+            entry.checked_at = time.monotonic()
+            if entry.rollups is not None and version == entry.version:
+                ctr_metrics.count("rollup.hit")
+                return entry
+            ctr_metrics.count("rollup.miss")
+            entry.rollups = load_rollups(self.db, sch_date)
+            if version is None or version[1] != version[0]:
+                # Stale, so load_rollups() rebuilt them: keep the catalog row
+                # as that left it
+                version = self._version(sch_date)
+            entry.version = version
+            entry.forget_derived()
+        return entry
+
+    def get(self, sch_date):
+        """(per-train, per-station) rollups of `sch_date`."""
+        return self._load(sch_date).rollups
+
+    def derived(self, sch_date, build, *args, base=None):
+        """build(rollups, *args), memoised until the date's rollups are reloaded.
+
+        With `base`, build() gets a derived value instead of the rollups:
+        `base` is a build function, or (build, args, base) for one that
+        takes arguments.
+        """
+        entry = self._load(sch_date)
+
+        def make():
+            if base is None:
+                source = entry.rollups
+            elif callable(base):
+                source = self.derived(sch_date, base)
+            else:
+                source = self.derived(sch_date, base[0], *base[1], base=base[2])
+            return build(source, *args)
+
+        return entry.derive((build, args, base), make, self.max_derived)
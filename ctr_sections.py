@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+import ctr_metrics
+
+
+def sort_records(df):
+    """Order a day's CTR records by train, then by SL/No within the train."""
+    if df.empty:
+        return df.reset_index(drop=True)
+    return df.sort_values(["Train No", "SL/No"], kind="stable", ignore_index=True)
+
+
+def value_rows(codes, values):
+    """Value -> its ascending row positions, from pd.factorize() output.
+
+    Keys are str(value), so lookups don't depend on the column's dtype;
+    missing values (code -1) are left out.
+    """
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=len(values))
+    return dict(zip(map(str, values), np.split(order[len(order) - counts.sum():], np.cumsum(counts)[:-1])))
+
+
+def section_bounds(train_codes, a_pos, b_pos):
+    """Row ranges [start, end] of every A -> B run in sorted records.
+
+    `a_pos` and `b_pos` are the ascending row positions of A and B in records
+    sorted with sort_records(). A run starts at the first A of a train and
+    ends at the next B of the same train; after a B the search starts over,
+    so a train that passes A -> B twice yields two runs.
+    """
+    if not len(a_pos) or not len(b_pos):
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    # Next B after every A, kept only when it belongs to the same train.
+    nxt = np.searchsorted(b_pos, a_pos, side="right")
+    has_b = nxt < len(b_pos)
+    a_pos, nxt = a_pos[has_b], nxt[has_b]
+    end = b_pos[nxt]
+    same_train = train_codes[a_pos] == train_codes[end]
+    a_pos, end = a_pos[same_train], end[same_train]
+    # Several A before the same B: the run starts at the first of them.
+    end, first = np.unique(end, return_index=True)
+    return a_pos[first], end
+
+
+def _row_positions(starts, ends):
+    lengths = ends - starts + 1
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+class SectionIndex:
+    """Station and train positions of one Sch date's records.
+
+    Built once per date; afterwards a section query only touches the rows
+    of its two stations instead of rescanning the whole day.
+    """
+
+    def __init__(self, df):
+        with ctr_metrics.span("section_index", rows=len(df)):
+            self._build(df)
+
+    def _build(self, df):
+        self.records = sort_records(df)
+        self.train_codes, self.trains = pd.factorize(self.records["Train No"])
+        self.stn_codes, self.stations = pd.factorize(self.records["Stn"])
+        self._stn_rows = value_rows(self.stn_codes, self.stations)
+        # train -> [start, end) rows; sorted records keep each train contiguous
+        train_range = np.arange(len(self.trains))
+        self._train_start = dict(zip(self.trains, np.searchsorted(self.train_codes, train_range, side="left")))
+        self._train_end = dict(zip(self.trains, np.searchsorted(self.train_codes, train_range, side="right")))
+
+    def station_rows(self, stn):
+        return self._stn_rows.get(str(stn), np.empty(0, dtype=np.intp))
+
+    def station_trains(self, stn):
+        """Trains that have a record at `stn`."""
+        return self.trains[np.unique(self.train_codes[self.station_rows(stn)])]
+
+    def train_stations(self, train_no):
+        """Stations of `train_no` in SL/No order."""
+        train_no = str(train_no)
+        if train_no not in self._train_start:
+            return self.stations[:0]
+        rows = slice(self._train_start[train_no], self._train_end[train_no])
+        return self.stations[self.stn_codes[rows]]
+
+    def has_station(self, train_no, stn):
+        return stn in set(self.train_stations(train_no))
+
+    def section_bounds(self, stn_a, stn_b):
+        """(trains, starts, ends) of every A -> B run; rows are inclusive."""
+        if stn_a == stn_b:
+            empty = np.empty(0, dtype=np.intp)
+            return self.trains[:0], empty, empty
+        starts, ends = section_bounds(self.train_codes, self.station_rows(stn_a), self.station_rows(stn_b))
+        return self.trains[self.train_codes[starts]], starts, ends
+
+    def sections(self, pairs):
+        """Rows of every train's run between each (Stn_A, Stn_B) in `pairs`.
+
+        The result carries "Stn_A" and "Stn_B" columns naming the pair each
+        row belongs to.
+        """
+        parts = []
+        for stn_a, stn_b in pairs:
+            _, starts, ends = self.section_bounds(stn_a, stn_b)
+            if len(starts):
+                part = self.records.iloc[_row_positions(starts, ends)]
+                parts.append(part.assign(Stn_A=stn_a, Stn_B=stn_b))
+        if not parts:
+            return self.records.iloc[:0].assign(Stn_A=pd.Series(dtype=object), Stn_B=pd.Series(dtype=object))
+        return pd.concat(parts, ignore_index=True)
+
+    def section(self, stn_a, stn_b):
+        """Rows of every train's run from Stn_A to Stn_B, A and B included."""
+        return self.sections([(stn_a, stn_b)]).drop(columns=["Stn_A", "Stn_B"])
+
+
+def station_speed_stats(rows, by=("Stn",)):
+    """Max, min and mean Max Speed per station of section rows."""
+    stats = rows.groupby(list(by), sort=False, observed=True)["Max Speed"].agg(["max", "min", "mean"]).reset_index()
+    return stats.rename(columns={"max": "Max Speed", "min": "Min Speed", "mean": "Avg Speed"})
+
+
+def extract_sections(df, pairs):
+    """Rows of every train's run between each (Stn_A, Stn_B) in `pairs`.
+
+    One pass over the day: records are sorted and coded once, then every
+    pair is resolved with array searches.
+    """
+    return SectionIndex(df).sections(pairs)
+
+
+def extract_section(df, stn_a, stn_b):
+    """Rows of every train's run from Stn_A to Stn_B, A and B included."""
+    return SectionIndex(df).section(stn_a, stn_b)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+import ctr_db
+
+SPEED_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def load_distances(collection):
+    """Section distance table from Section_Distance, both directions."""
+    return symmetric_distances(ctr_db.fetch_frame(collection, {}, ("From", "To", "Distance")))
+
+
+def symmetric_distances(df):
+    df = df.assign(Distance=pd.to_numeric(df["Distance"], errors="coerce"))
+    df = df[df["Distance"] > 0]
+    reverse = df.rename(columns={"From": "To", "To": "From"})
+    both = pd.concat([df, reverse], ignore_index=True)
+    return both.drop_duplicates(["From", "To"], keep="first")[["From", "To", "Distance"]]
+
+
+def _speed(distance, minutes):
+    minutes = np.where(minutes > 0, minutes, np.nan)
+    return distance * 60 / minutes
+
+
+def sectional_speeds(runs, distances):
+    """Scheduled and actual average speed (km/h) of every hop in `runs`.
+
+    `runs` comes from ctr_times.running_times(), for one date or several
+    concatenated; hops without a known distance are dropped.
+    """
+    speeds = runs.merge(distances, on=["From", "To"], how="inner")
+    speeds["Sch Speed"] = _speed(speeds["Distance"].to_numpy(), speeds["Sch Run"].to_numpy())
+    speeds["Act Speed"] = _speed(speeds["Distance"].to_numpy(), speeds["Act Run"].to_numpy())
+    return speeds
+
+
+def speed_summary(speeds):
+    """Per (From, To) section: runs, distance and the actual speed distribution."""
+    grouped = speeds.groupby(["From", "To"], sort=False)
+    summary = grouped.agg(
+        Runs=("Act Speed", "count"),
+        Distance=("Distance", "first"),
+        **{"Avg Sch Speed": ("Sch Speed", "mean"), "Avg Act Speed": ("Act Speed", "mean")},
+    )
+    quantiles = grouped["Act Speed"].quantile(list(SPEED_QUANTILES)).unstack()
+    quantiles.columns = [f"P{round(q * 100)}" for q in SPEED_QUANTILES]
+    return summary.join(quantiles).reset_index()
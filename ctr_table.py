@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TableView:
+    """Sorted, filtered windows of a frame, for tables shown a page at a time.
+
+    The frame stays on the server; rows() hands out only the requested
+    window. Row orders are memoised per (sort, filter), so paging through
+    a result doesn't sort it again. Safe to share between sessions; the
+    frame must not be modified.
+    """
+
+    def __init__(self, frame, max_orders=8):
+        self.frame = frame
+        self.columns = list(frame.columns)
+        self.max_orders = max_orders
+        self._orders = OrderedDict()
+        self._text = None
+        self._lock = threading.Lock()
+
+    def _matches(self, text):
+        if self._text is None:
+            # Lower-cased text of every cell, built on the first filter. Through
+            # object: with a blank in the column, pandas 3 strings converted
+            # straight to dtype=str are cut to their first character
+            self._text = [self.frame[column].astype(str).str.lower().to_numpy(dtype=object).astype(str)
+                          for column in self.columns]
+        text = text.lower()
+        mask = np.zeros(len(self.frame), dtype=bool)
+        for values in self._text:
+            mask |= np.char.find(values, text) >= 0
+        return np.flatnonzero(mask)
+
+    def order(self, sort_by=None, ascending=True, text=None):
+        """Row positions matching `text` (any cell, case-insensitive), sorted."""
+        key = (sort_by, ascending, text or None)
+        with self._lock:
+            if key in self._orders:
+                self._orders.move_to_end(key)
+                return self._orders[key]
+            positions = self._order(sort_by, ascending, text)
+            self._orders[key] = positions
+            while len(self._orders) > self.max_orders:
+                self._orders.popitem(last=False)
+            return positions
+
+    def _order(self, sort_by, ascending, text):
+        positions = self._matches(text) if text else np.arange(len(self.frame))
+        if sort_by is not None:
+            values = self.frame[sort_by].iloc[positions].reset_index(drop=True)
+            # Stable, with blanks last whichever the direction
+            ranked = values.sort_values(ascending=ascending, kind="stable", na_position="last")
+            positions = positions[ranked.index.to_numpy()]
+        return positions
+
+    def rows(self, start, stop, sort_by=None, ascending=True, text=None):
+        """(rows start:stop of the sorted, filtered table, number of matching rows)."""
+        positions = self.order(sort_by, ascending, text)
+        return self.frame.iloc[positions[start:stop]], len(positions)
+
+
+def page_bounds(page, page_size, total):
+    """(start, stop, pages) of 1-based `page`; pages past the end show the last one."""
+    pages = max(1, -(-total // page_size))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total), pages
+
+
+def pivot_view(view):
+    """TableView of the pivot of a (pivot, figure) view, row labels as a column."""
+    return None if view is None else TableView(view[0].reset_index())
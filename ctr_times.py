@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+import ctr_sections
+
+TIME_COLUMNS = ("S/Arr", "S/Dep", "A/Arr", "A/Dep")
+# A step back of more than half a day between two events of a train means
+# the clock went past midnight.
+ROLLOVER_MINUTES = 12 * 60
+
+
+def parse_minutes(values):
+    """Minutes after midnight of "HH:MM" / "HH:MM:SS" values; NaN if blank.
+
+    Anything before the time (a date, say) is ignored and seconds are
+    dropped.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        # Already packed into minutes
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    parts = values.astype(str).str.extract(r"(\d{1,2}):(\d{2})(?::\d{2})?\s*$")
+    return (pd.to_numeric(parts[0]) * 60 + pd.to_numeric(parts[1])).to_numpy(dtype=float)
+
+
+def format_minutes(values):
+    """"HH:MM" of minutes after midnight; blank where missing."""
+    minutes = pd.Series(values, dtype="Int64") % 1440
+    clock = (minutes // 60).astype(str).str.zfill(2) + ":" + (minutes % 60).astype(str).str.zfill(2)
+    return clock.where(minutes.notna(), "")
+
+
+def unroll_midnight(minutes, train_codes):
+    """Add a day to every event of a train that comes after a midnight wrap.
+
+    `minutes` must be in event order within each train.
+    """
+    events = pd.Series(minutes)
+    prev = events.groupby(train_codes).ffill().groupby(train_codes).shift()
+    wrapped = (events - prev) < -ROLLOVER_MINUTES
+    return minutes + wrapped.groupby(train_codes).cumsum().to_numpy() * 1440
+
+
+def _event_minutes(records, train_codes, arr_column, dep_column):
+    # Arrival then departure at every station, in SL/No order
+    events = np.column_stack([parse_minutes(records[arr_column]), parse_minutes(records[dep_column])]).ravel()
+    events = unroll_midnight(events, np.repeat(train_codes, 2))
+    return events[0::2], events[1::2]
+
+
+def running_times(df):
+    """Scheduled vs actual running time of every consecutive station pair.
+
+    One row per (train, From, To) hop with "Sch Run", "Act Run" and "Lost"
+    in minutes; a negative "Lost" is time made up.
+    """
+    records = ctr_sections.sort_records(df)
+    train_codes = pd.factorize(records["Train No"])[0]
+    s_arr, s_dep = _event_minutes(records, train_codes, "S/Arr", "S/Dep")
+    a_arr, a_dep = _event_minutes(records, train_codes, "A/Arr", "A/Dep")
+    hop = np.flatnonzero(train_codes[1:] == train_codes[:-1])
+    runs = pd.DataFrame({
+        "Train No": records["Train No"].to_numpy()[hop],
+        "From": records["Stn"].to_numpy()[hop],
+        "To": records["Stn"].to_numpy()[hop + 1],
+        "Sch Run": s_arr[hop + 1] - s_dep[hop],
+        "Act Run": a_arr[hop + 1] - a_dep[hop],
+    })
+    runs["Lost"] = runs["Act Run"] - runs["Sch Run"]
+    return runs
+
+
+def section_summary(runs):
+    """Per (From, To) section: trains and mean/max running and lost minutes."""
+    grouped = runs.groupby(["From", "To"], sort=False)
+    summary = grouped.agg(
+        Trains=("Train No", "nunique"),
+        **{
+            "Avg Sch Run": ("Sch Run", "mean"),
+            "Avg Act Run": ("Act Run", "mean"),
+            "Avg Lost": ("Lost", "mean"),
+            "Max Lost": ("Lost", "max"),
+            "Total Lost": ("Lost", "sum"),
+        },
+    )
+    return summary.reset_index()
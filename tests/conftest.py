@@ -0,0 +1,21 @@
+"""Shared fixtures: a mongomock CoachingInsights database with a few CTR days."""
+import os
+import sys
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ctr_db  # noqa: E402
+
+
+def ctr_doc(train_no, sch_date, sl_no, stn, max_speed, times=("10:00", "10:01", "10:00", "10:02"), **fields):
+    s_arr, s_dep, a_arr, a_dep = times
+    return {"Train No": train_no, "Sch date": sch_date, "SL/No": sl_no, "Stn": stn,
+            "S/Arr": s_arr, "S/Dep": s_dep, "A/Arr": a_arr, "A/Dep": a_dep, "Max Speed": max_speed, **fields}
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()[ctr_db.DB_NAME]
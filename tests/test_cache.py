@@ -0,0 +1,146 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+import ctr_cache
+import ctr_db
+import ctr_metrics
+from conftest import ctr_doc
+
+TODAY = datetime.date.today().isoformat()
+CLOSED = "2020-01-01"
+STAMP = datetime.datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def frame_cache(db, tmp_path):
+    return ctr_cache.CTRFrameCache(db[ctr_db.CTR_COLLECTION], ctr_db.TRAIN_COLUMNS, watermark_field="Updated",
+                                   refresh_seconds=0, catalog=db[ctr_db.DATES_COLLECTION],
+                                   disk=ctr_cache.DiskFrameCache(str(tmp_path / "disk"), 1 << 30))
+
+
+def speeds(frame):
+    return sorted(frame["Max Speed"].tolist())
+
+
+def test_open_date_merges_new_documents(db, frame_cache):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    ctr.insert_many([ctr_doc("31001", TODAY, 1, "SDAH", 60), ctr_doc("31001", TODAY, 2, "BLH", 70)])
+    assert speeds(frame_cache.get(None, TODAY)) == [60, 70]
+    ctr.insert_one(ctr_doc("31003", TODAY, 1, "SDAH", 80))
+    assert speeds(frame_cache.get(None, TODAY)) == [60, 70, 80]
+
+
+def test_open_date_merges_changed_documents(db, frame_cache):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    ctr.insert_many([ctr_doc("31001", TODAY, 1, "SDAH", 100, Updated=STAMP), ctr_doc("31001", TODAY, 2, "BLH", 90)])
+    assert speeds(frame_cache.get(None, TODAY)) == [90, 100]
+    ctr.update_one({"SL/No": 1}, {"$set": {"Max Speed": 999, "Updated": STAMP + datetime.timedelta(seconds=1)}})
+    # Documents without the stamp are still picked up by _id
+    ctr.insert_one(ctr_doc("31003", TODAY, 1, "SDAH", 50))
+    frame = frame_cache.get(None, TODAY)
+    assert speeds(frame) == [50, 90, 999]
+    assert len(frame) == 3
+
+
+def test_closed_date_is_kept_until_its_catalog_row_is_rewritten(db, frame_cache):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    ctr.insert_one(ctr_doc("31001", CLOSED, 1, "SDAH", 70))
+    ctr_db.refresh_date_catalog(db, [CLOSED])
+    assert speeds(frame_cache.get(None, CLOSED)) == [70]
+    ctr.update_one({"Sch date": CLOSED}, {"$set": {"Max Speed": 71, "Updated": STAMP}})
+    assert speeds(frame_cache.get(None, CLOSED)) == [70]
+    # As ctr_ingest does after loading the date
+    ctr_db.refresh_date_catalog(db, [CLOSED], rewritten=True)
+    assert speeds(frame_cache.get(None, CLOSED)) == [71]
+
+
+def test_catalog_reads_keep_a_closed_latest_date(db, frame_cache):
+    # The latest date is closed (a holiday, or an ingest running late)
+    db[ctr_db.CTR_COLLECTION].insert_one(ctr_doc("31001", CLOSED, 1, "SDAH", 70))
+    ctr_db.load_date_catalog(db)
+    frame = frame_cache.get(None, CLOSED)
+    rewritten = ctr_metrics.totals()[1].get("cache.rewritten", 0)
+    for _ in range(3):
+        ctr_db.load_date_catalog(db)
+        ctr_db.refresh_date_catalog(db, [CLOSED])
+        assert frame_cache.get(None, CLOSED) is not None
+    assert ctr_metrics.totals()[1].get("cache.rewritten", 0) == rewritten
+    assert os.path.exists(frame_cache.disk.path(CLOSED, frame_cache.columns))
+    assert speeds(frame) == [70]
+
+
+def test_closed_date_is_read_back_from_disk(db, frame_cache):
+    db[ctr_db.CTR_COLLECTION].insert_one(ctr_doc("31001", CLOSED, 1, "SDAH", 70))
+    frame_cache.get(None, CLOSED)
+    db[ctr_db.CTR_COLLECTION].delete_many({})
+    fresh = ctr_cache.CTRFrameCache(db[ctr_db.CTR_COLLECTION], ctr_db.TRAIN_COLUMNS, disk=frame_cache.disk)
+    assert speeds(fresh.get(None, CLOSED)) == [70]
+
+
+def test_disk_file_of_an_older_catalog_version_is_a_miss(db, frame_cache):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    ctr.insert_one(ctr_doc("31001", CLOSED, 1, "SDAH", 70))
+    ctr_db.refresh_date_catalog(db, [CLOSED])
+    frame_cache.get(None, CLOSED)
+    # Rewritten by an ingest that couldn't reach this disk cache
+    ctr.update_one({"Sch date": CLOSED}, {"$set": {"Max Speed": 99}})
+    ctr_db.refresh_date_catalog(db, [CLOSED], rewritten=True)
+    restarted = ctr_cache.CTRFrameCache(db[ctr_db.CTR_COLLECTION], ctr_db.TRAIN_COLUMNS,
+                                        catalog=db[ctr_db.DATES_COLLECTION], disk=frame_cache.disk)
+    assert speeds(restarted.get(None, CLOSED)) == [99]
+
+
+def test_train_and_station_subsets_come_from_the_date_frame(db, frame_cache):
+    db[ctr_db.CTR_COLLECTION].insert_many([
+        ctr_doc("31001", CLOSED, 1, "SDAH", 60), ctr_doc("31001", CLOSED, 2, "BLH", 70),
+        ctr_doc("31003", CLOSED, 1, "BLH", 80),
+    ])
+    assert speeds(frame_cache.get("31001", CLOSED)) == [60, 70]
+    assert speeds(frame_cache.get(None, CLOSED, stn="BLH")) == [70, 80]
+    assert speeds(frame_cache.get("31003", CLOSED, stn="BLH")) == [80]
+    assert frame_cache.get("39999", CLOSED).empty
+
+
+def test_derived_is_rebuilt_only_when_the_frame_changes(db, frame_cache):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    ctr.insert_one(ctr_doc("31001", TODAY, 1, "SDAH", 60))
+    first = frame_cache.derived(None, TODAY, len)
+    assert frame_cache.derived(None, TODAY, len) == first == 1
+    ctr.insert_one(ctr_doc("31001", TODAY, 2, "BLH", 70))
+    assert frame_cache.derived(None, TODAY, len) == 2
+
+
+def compact(docs):
+    return ctr_cache.compact_frame(pd.DataFrame(docs)[list(ctr_db.TRAIN_COLUMNS)])
+
+
+def test_disk_cache_evicts_least_recently_read(tmp_path):
+    frame = compact([ctr_doc("31001", CLOSED, n, "SDAH", 60) for n in range(1, 200)])
+    columns = ctr_db.TRAIN_COLUMNS
+    disk = ctr_cache.DiskFrameCache(str(tmp_path), 1 << 30)
+    disk.store("2020-01-01", columns, frame)
+    disk.store("2020-01-02", columns, frame)
+    for day in ("2020-01-01", "2020-01-02"):
+        os.utime(disk.path(day, columns), (1, 1))
+    # Room for two files: reading the first makes the second the oldest
+    disk.max_bytes = int(os.path.getsize(disk.path("2020-01-01", columns)) * 2.5)
+    assert disk.load("2020-01-01", columns) is not None
+    disk.store("2020-01-03", columns, frame)
+    assert not os.path.exists(disk.path("2020-01-02", columns))
+    assert disk.load("2020-01-01", columns) is not None
+    assert disk.load("2020-01-03", columns) is not None
+
+
+def test_disk_cache_invalidate_drops_every_column_set(tmp_path):
+    frame = compact([ctr_doc("31001", CLOSED, 1, "SDAH", 60)])
+    disk = ctr_cache.DiskFrameCache(str(tmp_path), 1 << 30)
+    disk.store(CLOSED, ctr_db.TRAIN_COLUMNS, frame)
+    disk.store(CLOSED, ctr_db.SECTION_COLUMNS, frame)
+    disk.store("2020-01-02", ctr_db.SECTION_COLUMNS, frame)
+    disk.invalidate(CLOSED)
+    assert disk.load(CLOSED, ctr_db.TRAIN_COLUMNS) is None
+    assert disk.load(CLOSED, ctr_db.SECTION_COLUMNS) is None
+    assert disk.load("2020-01-02", ctr_db.SECTION_COLUMNS) is not None
@@ -0,0 +1,20 @@
+import ctr_db
+from conftest import ctr_doc
+
+
+def test_date_catalog_counts_and_latest_refresh(db):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    ctr.insert_many([
+        ctr_doc("31001", "2024-01-05", 1, "SDAH", 60), ctr_doc("31001", "2024-01-05", 2, "BLH", 70),
+        ctr_doc("31003", "2024-01-06", 1, "SDAH", 80),
+    ])
+    assert ctr_db.load_date_catalog(db) == [
+        {"Sch date": "2024-01-05", "Trains": 1, "Stations": 2, "Records": 2},
+        {"Sch date": "2024-01-06", "Trains": 1, "Stations": 1, "Records": 1},
+    ]
+    stamp = db[ctr_db.DATES_COLLECTION].find_one({"_id": "2024-01-06"})["updated"]
+    # Nothing new: the latest row is read, not rewritten
+    ctr_db.load_date_catalog(db)
+    assert db[ctr_db.DATES_COLLECTION].find_one({"_id": "2024-01-06"})["updated"] == stamp
+    ctr.insert_one(ctr_doc("31005", "2024-01-06", 1, "KDH", 40))
+    assert ctr_db.load_date_catalog(db)[-1] == {"Sch date": "2024-01-06", "Trains": 2, "Stations": 2, "Records": 2}
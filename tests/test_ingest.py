@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+import ctr_db
+import ctr_ingest
+from conftest import ctr_doc
+
+
+def export(rows):
+    # As read_batches() hands them over: strings, blanks as ""
+    return pd.DataFrame(rows, dtype=str).fillna("")
+
+
+def test_normalise_types_and_formats():
+    batch = export([
+        {"Train No": "31411.0", "Sch date": "05-01-2024", "SL/No": "3", "Stn": " SDAH ",
+         "S/Arr": "2024-01-05 07:05:00", "S/Dep": "7:06", "A/Arr": "", "A/Dep": "07:09", "Max Speed": "82.5",
+         "Remarks": " late "},
+        {"Train No": "31413", "Sch date": "2024-01-05", "SL/No": "1", "Stn": "BLH", "Max Speed": "x"},
+    ])
+    docs, rejected = ctr_ingest.normalise(batch)
+    assert rejected == 0
+    first, second = docs.to_dict("records")
+    assert first["Train No"] == "31411"
+    assert first["Sch date"] == second["Sch date"] == "2024-01-05"
+    assert first["SL/No"] == 3
+    assert first["Stn"] == "SDAH"
+    assert (first["S/Arr"], first["S/Dep"], first["A/Arr"], first["A/Dep"]) == ("07:05", "07:06", "", "07:09")
+    assert first["Max Speed"] == 82.5
+    assert first["Remarks"] == "late"
+    assert second["Max Speed"] is None
+
+
+def test_normalise_drops_rows_without_a_key():
+    batch = export([
+        {"Train No": "31411", "Sch date": "2024-01-05", "SL/No": "1", "Stn": "SDAH"},
+        {"Train No": "", "Sch date": "2024-01-05", "SL/No": "2", "Stn": "BLH"},
+        {"Train No": "31411", "Sch date": "not a date", "SL/No": "3", "Stn": "BLH"},
+        {"Train No": "31411", "Sch date": "2024-01-05", "SL/No": "", "Stn": "BLH"},
+        {"Train No": "31411", "Sch date": "2024-01-05", "SL/No": "4", "Stn": ""},
+    ])
+    docs, rejected = ctr_ingest.normalise(batch)
+    assert rejected == 4
+    assert docs["SL/No"].tolist() == [1]
+
+
+def test_normalise_needs_the_key_columns():
+    with pytest.raises(ValueError, match="SL/No"):
+        ctr_ingest.normalise(export([{"Train No": "31411", "Sch date": "2024-01-05", "Stn": "SDAH"}]))
+
+
+def test_ingest_replaces_rows_stored_before_it(db, tmp_path):
+    ctr = db[ctr_db.CTR_COLLECTION]
+    # Loaded by hand earlier, SL/No and Max Speed as strings
+    ctr.insert_many([ctr_doc("31411", "2024-01-05", str(n), stn, "60") for n, stn in enumerate(["SDAH", "BLH"], 1)])
+    path = tmp_path / "ctr.csv"
+    pd.DataFrame([ctr_doc("31411", "2024-01-05", n, stn, 70) for n, stn in enumerate(["SDAH", "BLH", "KDH"], 1)]
+                 ).to_csv(path, index=False)
+    for _ in range(2):
+        totals = ctr_ingest.ingest(db, [str(path)], report=lambda line: None)
+    assert totals["rows"] == 3
+    assert ctr.count_documents({}) == 3
+    assert sorted(doc["Max Speed"] for doc in ctr.find()) == [70, 70, 70]
+    assert {type(doc["SL/No"]) for doc in ctr.find()} == {int}
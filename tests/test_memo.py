@@ -0,0 +1,30 @@
+import ctr_memo
+
+
+def test_entries_drop_the_least_recently_used():
+    entries = ctr_memo.Entries(ctr_memo.Entry, max_entries=2)
+    first = entries.get("a")
+    entries.get("b")
+    assert entries.get("a") is first
+    entries.get("c")
+    assert entries.peek("b") is None
+    assert entries.peek("a") is first
+    assert len(entries.values()) == 2
+
+
+def test_derived_values_are_memoised_and_trimmed():
+    entry = ctr_memo.Entry()
+    calls = []
+
+    def make(key):
+        return lambda: calls.append(key) or key
+
+    assert entry.derive("x", make("x"), max_derived=2) == "x"
+    assert entry.derive("x", make("x"), max_derived=2) == "x"
+    entry.derive("y", make("y"), max_derived=2)
+    entry.derive("x", make("x"), max_derived=2)
+    entry.derive("z", make("z"), max_derived=2)
+    assert list(entry.derived) == ["x", "z"]
+    entry.forget_derived()
+    entry.derive("x", make("x"), max_derived=2)
+    assert calls == ["x", "y", "z", "x"]
@@ -0,0 +1,60 @@
+import pandas as pd
+
+import ctr_overspeed
+
+LIMITS = pd.DataFrame({"From": ["SDAH", "BLH"], "To": ["BLH", "SDAH"], "Limit": [60.0, 60.0]})
+
+
+def records(*rows):
+    return pd.DataFrame(rows, columns=["Sch date", "Train No", "SL/No", "Stn", "Max Speed"])
+
+
+def test_a_trains_first_station_closes_no_hop():
+    # The first record has no hop behind it, however fast
+    found = ctr_overspeed.scan_overspeed(records(
+        ("2024-01-05", "31001", 1, "SDAH", 120), ("2024-01-05", "31001", 2, "BLH", 65),
+    ), LIMITS, default_limit=50)
+    assert found[["From", "Stn", "Max Speed", "Limit", "Excess"]].values.tolist() == [["SDAH", "BLH", 65, 60, 5]]
+
+
+def test_default_limit_and_tolerance():
+    day = records(
+        ("2024-01-05", "31001", 1, "SDAH", 50), ("2024-01-05", "31001", 2, "BLH", 63),
+        ("2024-01-05", "31001", 3, "KDH", 70),
+    )
+    # BLH -> KDH has no limit: unchecked without a default
+    assert ctr_overspeed.scan_overspeed(day, LIMITS)["Stn"].tolist() == ["BLH"]
+    assert ctr_overspeed.scan_overspeed(day, LIMITS, default_limit=65)["Stn"].tolist() == ["BLH", "KDH"]
+    assert ctr_overspeed.scan_overspeed(day, LIMITS, default_limit=65, tolerance=5)["Stn"].tolist() == []
+
+
+def test_runs_of_a_train_on_two_dates_stay_apart():
+    # Without the date, the 05th's last BLH would make the 06th's SDAH a
+    # BLH -> SDAH hop
+    found = ctr_overspeed.scan_overspeed(records(
+        ("2024-01-06", "31001", 1, "SDAH", 90), ("2024-01-06", "31001", 2, "BLH", 55),
+        ("2024-01-05", "31001", 1, "SDAH", 50), ("2024-01-05", "31001", 2, "BLH", 70),
+    ), LIMITS)
+    assert found[["Sch date", "From", "Stn"]].values.tolist() == [["2024-01-05", "SDAH", "BLH"]]
+
+
+def test_empty_records():
+    found = ctr_overspeed.scan_overspeed(records(), LIMITS)
+    assert found.empty and list(found.columns) == list(ctr_overspeed.VIOLATION_COLUMNS)
+
+
+def test_violation_index_lookups_intersect():
+    found = ctr_overspeed.scan_overspeed(records(
+        ("2024-01-05", "31001", 1, "SDAH", 50), ("2024-01-05", "31001", 2, "BLH", 70),
+        ("2024-01-05", "31001", 3, "SDAH", 80),
+        ("2024-01-05", "31003", 1, "SDAH", 50), ("2024-01-05", "31003", 2, "BLH", 75),
+        ("2024-01-06", "31001", 1, "SDAH", 50), ("2024-01-06", "31001", 2, "BLH", 66),
+    ), LIMITS)
+    index = ctr_overspeed.ViolationIndex(found)
+    assert index.values("Train No") == ["31001", "31003"]
+    assert len(index.lookup()) == 4
+    assert index.lookup(train_no=31001)["Max Speed"].tolist() == [70, 80, 66]
+    assert index.lookup(sch_date="2024-01-05", stn="BLH")["Train No"].tolist() == ["31001", "31003"]
+    assert index.lookup(sch_date="2024-01-06", train_no="31001", stn="BLH")["Max Speed"].tolist() == [66]
+    assert index.lookup(sch_date="2024-01-06", train_no="31003").empty
+    assert index.lookup(stn="KDH").empty
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+import ctr_prefetch
+
+
+@pytest.fixture
+def gate():
+    # A job that holds the only worker until the gate opens, so jobs
+    # scheduled meanwhile stay queued
+    opened, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        opened.wait(5)
+
+    yield hold, started, opened
+    opened.set()
+
+
+def make_prefetcher(request, **kwargs):
+    prefetcher = ctr_prefetch.Prefetcher(max_workers=1, **kwargs)
+    request.addfinalizer(prefetcher.shutdown)
+    return prefetcher
+
+
+def settle(prefetcher):
+    wait([future for batch in list(prefetcher._batches.values()) for future in batch.futures], timeout=5)
+
+
+def test_a_new_selection_cancels_the_queued_jobs_of_the_previous_one(request, gate):
+    hold, started, opened = gate
+    prefetcher = make_prefetcher(request)
+    ran = []
+    prefetcher.schedule("session", "2024-01-05", [(hold, ()), (ran.append, ("2024-01-04",))])
+    started.wait(5)
+    prefetcher.schedule("session", "2024-01-06", [(ran.append, ("2024-01-07",))])
+    opened.set()
+    settle(prefetcher)
+    assert ran == ["2024-01-07"]
+
+
+def test_rescheduling_the_same_selection_is_a_no_op(request, gate):
+    hold, started, opened = gate
+    prefetcher = make_prefetcher(request)
+    ran = []
+    prefetcher.schedule("session", "2024-01-05", [(hold, ()), (ran.append, ("2024-01-04",))])
+    started.wait(5)
+    prefetcher.schedule("session", "2024-01-05", [(hold, ()), (ran.append, ("2024-01-04",))])
+    opened.set()
+    settle(prefetcher)
+    # Rerun after the batch finished: still the same selection
+    prefetcher.schedule("session", "2024-01-05", [(ran.append, ("2024-01-04",))])
+    settle(prefetcher)
+    assert ran == ["2024-01-04"]
+
+
+def test_jobs_are_skipped_once_usage_reaches_max_bytes(request):
+    ran = []
+    prefetcher = make_prefetcher(request, max_bytes=200, usage=lambda: 100 * len(ran))
+    prefetcher.schedule("session", "2024-01-05", [(ran.append, (day,)) for day in ("04", "06", "03", "07")])
+    settle(prefetcher)
+    assert ran == ["04", "06"]
+
+
+def test_no_more_than_max_pending_jobs_are_queued(request, gate):
+    hold, started, opened = gate
+    prefetcher = make_prefetcher(request, max_pending=3)
+    ran = []
+    prefetcher.schedule("other", "2024-01-05", [(hold, ())])
+    started.wait(5)
+    prefetcher.schedule("session", "2024-01-05", [(ran.append, (day,)) for day in ("04", "06", "03", "07")])
+    prefetcher.schedule("late", "2024-01-05", [(ran.append, ("late",))])
+    opened.set()
+    settle(prefetcher)
+    assert ran == ["04", "06"]
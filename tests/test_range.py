@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+import ctr_range
+
+
+def test_histogram_sketch_quantiles_on_the_bucket_grid():
+    sketch = ctr_range.HistogramSketch(0, 150, 1)
+    rng = np.random.default_rng(0)
+    values = rng.integers(20, 120, size=5000).astype(float)
+    keys = np.where(np.arange(len(values)) % 2, "SDAH", "BLH")
+    # Folded in over several updates, as one date at a time
+    for part in np.array_split(np.arange(len(values)), 7):
+        sketch.update(keys[part], values[part])
+    summary = sketch.summary((0.1, 0.5, 0.9, 0.99))
+    for key in ("SDAH", "BLH"):
+        mine = np.sort(values[keys == key])
+        row = summary.loc[key]
+        assert row["Count"] == len(mine)
+        assert row["Min"] == mine.min() and row["Max"] == mine.max()
+        assert np.isclose(row["Mean"], mine.mean())
+        for q in (0.1, 0.5, 0.9, 0.99):
+            # Lower order statistic at rank ceil(q * n)
+            assert row[f"P{q * 100:g}"] == mine[int(np.ceil(q * len(mine))) - 1]
+
+
+def test_histogram_sketch_ignores_blanks_and_clips_to_the_edges():
+    sketch = ctr_range.HistogramSketch(0, 100, 10)
+    sketch.update(["A", "A", "A", "A"], [np.nan, -5, 55, 250])
+    row = sketch.summary((0.5, 0.99)).loc["A"]
+    assert row["Count"] == 3
+    assert row["Min"] == -5 and row["Max"] == 250
+    assert row["P50"] == 50
+    assert row["P99"] == 90
+
+
+def test_iter_date_frames_loads_one_date_at_a_time():
+    loaded = []
+
+    def load(sch_date):
+        loaded.append(sch_date)
+        return pd.DataFrame({"Sch date": [sch_date]})
+
+    frames = ctr_range.iter_date_frames(load, ["2024-01-05", "2024-01-06"])
+    assert next(frames)[0] == "2024-01-05"
+    assert loaded == ["2024-01-05"]
+    assert [sch_date for sch_date, _ in frames] == ["2024-01-06"]
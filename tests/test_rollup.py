@@ -0,0 +1,105 @@
+import datetime
+
+import pytest
+from mongomock.collection import Collection
+from pymongo.errors import OperationFailure
+
+import ctr_db
+import ctr_rollup
+from conftest import ctr_doc
+
+SCH_DATE = "2024-01-05"
+
+
+@pytest.fixture
+def day(db):
+    db[ctr_db.CTR_COLLECTION].insert_many([
+        ctr_doc("31001", SCH_DATE, 1, "SDAH", 60), ctr_doc("31001", SCH_DATE, 2, "BLH", 70),
+        ctr_doc("31003", SCH_DATE, 1, "SDAH", 80), ctr_doc("31003", SCH_DATE, 2, "BLH", 50),
+        # Back at SDAH later in the run: first SL/No, highest speed
+        ctr_doc("31003", SCH_DATE, 3, "SDAH", 90),
+    ])
+    return db
+
+
+def test_build_rollups(day):
+    records = ctr_db.fetch_frame(day[ctr_db.CTR_COLLECTION], {}, ctr_rollup.ROLLUP_COLUMNS)
+    trains, stations = ctr_rollup.build_rollups(records)
+    sdah = trains[(trains["Train No"] == "31003") & (trains["Stn"] == "SDAH")].iloc[0]
+    assert (sdah["SL/No"], sdah["Max Speed"]) == (1, 90)
+    stations = stations.set_index("Stn")
+    assert stations.loc["SDAH", ["Trains", "Max Speed", "Min Speed", "Avg Speed"]].tolist() == [2, 90, 60, 75]
+
+
+def test_uncatalogued_and_never_rolled_up_dates_are_stale(day):
+    assert ctr_rollup.stale_dates(day, [SCH_DATE]) == [SCH_DATE]
+    ctr_db.refresh_date_catalog(day, [SCH_DATE])
+    assert ctr_rollup.stale_dates(day, [SCH_DATE]) == [SCH_DATE]
+    ctr_rollup.refresh_rollups(day, [SCH_DATE])
+    assert ctr_rollup.stale_dates(day, [SCH_DATE]) == []
+
+
+def test_read_only_users_get_built_rollups(day, monkeypatch):
+    ctr_db.refresh_date_catalog(day, [SCH_DATE])
+
+    def denied(*args, **kwargs):
+        raise OperationFailure("not authorized")
+
+    for name in ("bulk_write", "update_one", "delete_many", "create_index"):
+        monkeypatch.setattr(Collection, name, denied)
+    trains, stations = ctr_rollup.load_rollups(day, SCH_DATE)
+    assert len(trains) == 4
+    assert sorted(stations["Stn"]) == ["BLH", "SDAH"]
+
+
+class DeleteLater:
+    """A collection whose next delete_many() first lets `other` run."""
+
+    def __init__(self, collection, other):
+        self.collection = collection
+        self.other = other
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def delete_many(self, *args, **kwargs):
+        self.other()
+        return self.collection.delete_many(*args, **kwargs)
+
+
+def test_overlapping_refreshes_keep_each_others_rows(day):
+    records = ctr_db.fetch_frame(day[ctr_db.CTR_COLLECTION], {}, ctr_rollup.ROLLUP_COLUMNS)
+    trains, _ = ctr_rollup.build_rollups(records)
+    collection = day[ctr_db.TRAIN_SPEED_COLLECTION]
+    first, second = datetime.datetime(2024, 1, 5, 10), datetime.datetime(2024, 1, 5, 10, 0, 1)
+    docs = {stamp: ctr_rollup._documents(trains, ("Sch date", "Stn", "Train No"), stamp) for stamp in (first, second)}
+    # The second refresh runs whole between the first one's upsert and delete
+    ctr_rollup._replace(DeleteLater(collection, lambda: ctr_rollup._replace(collection, SCH_DATE, docs[second], second)),
+                        SCH_DATE, docs[first], first)
+    assert collection.count_documents({"Sch date": SCH_DATE}) == len(trains)
+
+
+def test_refresh_drops_rows_gone_from_ctr_db(day):
+    ctr_db.refresh_date_catalog(day, [SCH_DATE])
+    ctr_rollup.refresh_rollups(day, [SCH_DATE])
+    day[ctr_db.CTR_COLLECTION].delete_many({"Train No": "31003"})
+    ctr_rollup.refresh_rollups(day, [SCH_DATE])
+    assert set(day[ctr_db.TRAIN_SPEED_COLLECTION].distinct("Train No")) == {"31001"}
+
+
+def test_rollup_cache_keeps_derived_values_until_the_date_changes(day):
+    ctr_db.refresh_date_catalog(day, [SCH_DATE])
+    cache = ctr_rollup.RollupCache(day, refresh_seconds=0)
+    index = cache.derived(SCH_DATE, ctr_rollup.section_index)
+    assert cache.derived(SCH_DATE, ctr_rollup.section_index) is index
+    day[ctr_db.CTR_COLLECTION].insert_one(ctr_doc("31005", SCH_DATE, 1, "KDH", 40))
+    ctr_db.refresh_date_catalog(day, [SCH_DATE])
+    rebuilt = cache.derived(SCH_DATE, ctr_rollup.section_index)
+    assert rebuilt is not index
+    assert "KDH" in set(cache.get(SCH_DATE)[1]["Stn"])
+
+
+def test_station_max_is_the_days_best_per_station(day):
+    ctr_db.refresh_date_catalog(day, [SCH_DATE])
+    station_max = ctr_rollup.RollupCache(day).derived(SCH_DATE, ctr_rollup.station_max)
+    assert station_max.to_dict() == {"BLH": 70, "SDAH": 90}
@@ -0,0 +1,75 @@
+import random
+
+import pandas as pd
+import pytest
+
+import ctr_sections
+
+STATIONS = ["SDAH", "BGB", "DDJ", "BNXR", "AGP", "DMDM", "BLH", "KDH", "SOD", "BT"]
+COLUMNS = ["Train No", "SL/No", "Stn", "Max Speed"]
+
+
+def loop_section(items, stn_a, stn_b):
+    """The per-record loop the Sections page used before extract_section()."""
+    stna_sl_no = stnb_sl_no = 0
+    stna_train_no = stnb_train_no = hold_train_no = ""
+    rows, pending = [], []
+    for item in items:
+        if item["Train No"] != hold_train_no:
+            stna_train_no = stnb_train_no = ""
+            stna_sl_no = stnb_sl_no = 0
+            pending = []
+        if item["Stn"] == stn_a:
+            stna_sl_no, stna_train_no = int(item["SL/No"]), item["Train No"]
+        if item["Stn"] == stn_b:
+            stnb_sl_no, stnb_train_no = int(item["SL/No"]), item["Train No"]
+        if stna_train_no:
+            pending.append(item)
+        if stna_train_no and stnb_train_no and stna_train_no != stnb_train_no:
+            stna_train_no = stnb_train_no = ""
+            pending = []
+        elif stna_train_no == stnb_train_no and stna_sl_no < stnb_sl_no:
+            rows.extend(pending)
+            pending = []
+            stna_train_no = stnb_train_no = ""
+            stna_sl_no = stnb_sl_no = 0
+        hold_train_no = item["Train No"]
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def random_day(seed, trains=40):
+    rnd = random.Random(seed)
+    items = []
+    for t in range(trains):
+        if t % 4 == 3:
+            # Loops and repeated stations
+            stops = [rnd.choice(STATIONS[:5]) for _ in range(rnd.randint(2, 12))]
+        else:
+            stops = STATIONS[: rnd.randint(2, len(STATIONS))]
+            stops = stops if t % 2 else stops[::-1]
+        items += [{"Train No": str(31000 + t), "SL/No": n, "Stn": stn, "Max Speed": float(rnd.randint(20, 90))}
+                  for n, stn in enumerate(stops, 1)]
+    return items
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_extract_section_matches_the_record_loop(seed):
+    items = random_day(seed)
+    df = ctr_sections.sort_records(pd.DataFrame(items).astype({"SL/No": "Int64"}))
+    rnd = random.Random(seed)
+    pairs = list(dict.fromkeys((rnd.choice(STATIONS), rnd.choice(STATIONS)) for _ in range(60)))
+    batch = ctr_sections.extract_sections(df, pairs)
+    for stn_a, stn_b in pairs:
+        expected = loop_section(df.to_dict("records"), stn_a, stn_b).astype({"SL/No": "Int64"})
+        got = ctr_sections.extract_section(df, stn_a, stn_b)[COLUMNS].reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+        from_batch = batch[(batch["Stn_A"] == stn_a) & (batch["Stn_B"] == stn_b)][COLUMNS].reset_index(drop=True)
+        pd.testing.assert_frame_equal(from_batch, expected, check_dtype=False)
+
+
+def test_section_index_answers_station_lookups():
+    df = pd.DataFrame(random_day(0)).astype({"SL/No": "Int64"})
+    index = ctr_sections.SectionIndex(df)
+    for train_no, stations in df.groupby("Train No")["Stn"]:
+        assert index.has_station(train_no, stations.iloc[0])
+    assert not index.has_station("39999", "SDAH")
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import ctr_table
+
+
+def table():
+    return ctr_table.TableView(pd.DataFrame({
+        "Train No": ["31001", "31003", "31005", "31007", "31009"],
+        "Stn": ["SDAH", "BLH", "sdah", "KDH", "BLH"],
+        "Max Speed": [70.0, np.nan, 50.0, 70.0, 60.0],
+    }))
+
+
+def test_filter_matches_any_cell_ignoring_case():
+    view = table()
+    assert view.frame["Train No"].iloc[view.order(text="SdAh")].tolist() == ["31001", "31005"]
+    assert view.frame["Train No"].iloc[view.order(text="70")].tolist() == ["31001", "31007"]
+    assert len(view.order(text="NJP")) == 0
+
+
+def test_sort_is_stable_with_blanks_last_both_ways():
+    view = table()
+    trains = view.frame["Train No"].to_numpy()
+    assert trains[view.order("Max Speed")].tolist() == ["31005", "31009", "31001", "31007", "31003"]
+    assert trains[view.order("Max Speed", ascending=False)].tolist() == ["31001", "31007", "31009", "31005", "31003"]
+    assert trains[view.order("Max Speed", text="blh")].tolist() == ["31009", "31003"]
+
+
+def test_orders_are_memoised_per_sort_and_filter():
+    view = ctr_table.TableView(table().frame, max_orders=2)
+    first = view.order("Max Speed")
+    assert view.order("Max Speed") is first
+    # An empty filter is no filter
+    assert view.order("Stn", text="") is view.order("Stn", text=None)
+    view.order("Stn", ascending=False)
+    assert view.order("Max Speed") is not first
+
+
+def test_rows_window_and_total():
+    rows, total = table().rows(1, 3, sort_by="Max Speed", text="h")
+    assert total == 5
+    assert rows["Train No"].tolist() == ["31009", "31001"]
+
+
+def test_page_bounds_clamp_to_the_pages_there_are():
+    assert ctr_table.page_bounds(1, 25, 60) == (0, 25, 3)
+    assert ctr_table.page_bounds(3, 25, 60) == (50, 60, 3)
+    assert ctr_table.page_bounds(9, 25, 60) == (50, 60, 3)
+    assert ctr_table.page_bounds(0, 25, 60) == (0, 25, 3)
+    assert ctr_table.page_bounds(2, 25, 0) == (0, 0, 1)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+import ctr_times
+from conftest import ctr_doc
+
+
+def test_parse_and_format_minutes():
+    minutes = ctr_times.parse_minutes(pd.Series(["00:05", "23:59:30", "2024-01-05 07:10", "", None]))
+    np.testing.assert_array_equal(minutes[:3], [5, 1439, 430])
+    assert np.isnan(minutes[3:]).all()
+    assert ctr_times.format_minutes(pd.Series([5, 1439, 1445, None])).tolist() == ["00:05", "23:59", "00:05", ""]
+
+
+def test_unroll_midnight_adds_a_day_after_the_wrap():
+    minutes = np.array([23 * 60 + 50, 23 * 60 + 58, 3, 10, 22 * 60, 22 * 60 + 5])
+    trains = np.array([0, 0, 0, 0, 1, 1])
+    np.testing.assert_array_equal(ctr_times.unroll_midnight(minutes, trains),
+                                  [1430, 1438, 1443, 1450, 1320, 1325])
+
+
+def test_unroll_midnight_skips_blanks_and_keeps_trains_apart():
+    # Train 0 wraps past a missing time; train 1 starts early without wrapping
+    minutes = np.array([23 * 60 + 55, np.nan, 5, 4 * 60, 4 * 60 + 5])
+    trains = np.array([0, 0, 0, 1, 1])
+    unrolled = ctr_times.unroll_midnight(minutes, trains)
+    np.testing.assert_array_equal(unrolled[[0, 2, 3, 4]], [1435, 1445, 240, 245])
+    assert np.isnan(unrolled[1])
+
+
+def test_running_times_across_midnight():
+    df = pd.DataFrame([
+        ctr_doc("31001", "2024-01-05", 1, "SDAH", 60, times=("", "23:50", "", "23:52")),
+        ctr_doc("31001", "2024-01-05", 2, "BGB", 60, times=("23:58", "23:59", "00:03", "00:04")),
+        ctr_doc("31001", "2024-01-05", 3, "DDJ", 60, times=("00:06", "", "00:10", "")),
+    ])
+    runs = ctr_times.running_times(df)
+    assert runs[["From", "To"]].values.tolist() == [["SDAH", "BGB"], ["BGB", "DDJ"]]
+    assert runs["Sch Run"].tolist() == [8, 7]
+    assert runs["Act Run"].tolist() == [11, 6]
+    assert runs["Lost"].tolist() == [3, -1]